@@ -14,6 +14,8 @@ from pathlib import Path
 from typing import Optional
 import asyncio
 import json
+import logging
+import os
 
 from discord_notifier import DiscordNotifier
 from nature_remo_controller import NatureRemoController
@@ -46,7 +48,7 @@ connection_info: dict = {
 history: deque = deque(maxlen=100)
 
 # WebSocket接続管理
-connected_clients: list[WebSocket] = []
+connected_clients: set[WebSocket] = set()
 
 # Mockモードフラグ
 _mock_mode: bool = False
@@ -56,7 +58,7 @@ _alert_threshold: int = 4000  # デフォルト閾値 (W)
 _alert_enabled: bool = True
 
 # 契約アンペア（使用量バー計算用）
-_contract_amperage: int = 40  # デフォルト40A
+app.state.contract_amperage = 40  # デフォルト40A
 
 # 設定ファイルパス
 _settings_file: Path = Path(__file__).parent / "settings.json"
@@ -68,6 +70,9 @@ discord_notifier: Optional[DiscordNotifier] = None
 _nature_remo_enabled: bool = False
 nature_remo_controller: Optional[NatureRemoController] = None
 
+# 実行中のアラート通知タスク（参照を保持してGCで消えないようにする）
+_alert_task: Optional[asyncio.Task] = None
+
 
 def set_mock_mode(mock: bool):
     """mockモードを設定"""
@@ -88,15 +93,24 @@ def _load_settings():
             pass
 
 
-def _save_settings():
-    """設定ファイルに保存"""
-    data = {
+def _settings_data() -> dict:
+    """保存対象の設定値"""
+    return {
         "alert_threshold": _alert_threshold,
         "alert_enabled": _alert_enabled,
     }
+
+
+def _save_settings(data: dict):
+    """設定ファイルに保存（ブロッキングI/Oなのでスレッドから呼ぶ）"""
+    # 一時ファイルに書いてから置き換え、書き込み途中で壊れたファイルが残らないようにする
+    tmp_file = _settings_file.with_suffix(".tmp")
     try:
-        with open(_settings_file, "w") as f:
+        with open(tmp_file, "w") as f:
             json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, _settings_file)
     except IOError:
         pass
 
@@ -104,6 +118,9 @@ def _save_settings():
 # 起動時に設定を読み込み
 _load_settings()
 
+# 設定ファイル書き込みの直列化（同じ一時ファイルへの同時書き込みを防ぐ）
+_settings_save_lock = asyncio.Lock()
+
 
 def set_alert_threshold(threshold: int):
     """閾値を設定"""
@@ -119,8 +136,7 @@ def set_alert_enabled(enabled: bool):
 
 def set_contract_amperage(amperage: int):
     """契約アンペアを設定"""
-    global _contract_amperage
-    _contract_amperage = amperage
+    app.state.contract_amperage = amperage
 
 
 def set_nature_remo_enabled(enabled: bool):
@@ -141,13 +157,39 @@ async def check_and_notify(power: int):
         f"閾値: {_alert_threshold:,}W"
     )
 
-    # Discord通知
+    # Discord通知とNature Remo制御は独立したHTTP呼び出しなので並行して待つ
+    tasks = []
     if discord_notifier is not None:
-        await discord_notifier.send(message, title="⚡ 電力アラート")
-
-    # Nature Remo制御
+        tasks.append(discord_notifier.send(message, title="⚡ 電力アラート"))
     if _nature_remo_enabled and nature_remo_controller is not None:
-        await nature_remo_controller.execute_actions()
+        tasks.append(nature_remo_controller.execute_actions())
+
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+def _log_alert_result(task: asyncio.Task):
+    """バックグラウンド通知の例外をログに残す"""
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Alert notification failed: {task.exception()}")
+
+
+def notify_in_background(power: int) -> Optional[asyncio.Task]:
+    """
+    閾値チェック・通知をバックグラウンドで開始
+
+    Discordのリトライ待ち等で電力取得ループを止めないよう、完了は待たない。
+    前回の通知がまだ実行中なら重ねて開始しない
+
+    Returns:
+        開始したタスク（開始しなかった場合はNone）
+    """
+    global _alert_task
+    if _alert_task is not None and not _alert_task.done():
+        return None
+    _alert_task = asyncio.create_task(check_and_notify(power))
+    _alert_task.add_done_callback(_log_alert_result)
+    return _alert_task
 
 
 def update_power_data(power: int | None):
@@ -165,17 +207,17 @@ async def broadcast_power_data():
         return
 
     data = json.dumps(current_data)
-    disconnected = []
+    disconnected = set()
 
-    for client in connected_clients:
+    # 送信中の切断で集合が変わるのでスナップショットを回す
+    for client in list(connected_clients):
         try:
             await client.send_text(data)
         except Exception:
-            disconnected.append(client)
+            disconnected.add(client)
 
-    # 切断されたクライアントを削除
-    for client in disconnected:
-        connected_clients.remove(client)
+    # 切断されたクライアントをまとめて削除
+    connected_clients.difference_update(disconnected)
 
 
 # --- REST API ---
@@ -238,7 +280,7 @@ async def get_settings():
     return {
         "alert_threshold": _alert_threshold,
         "alert_enabled": _alert_enabled,
-        "contract_amperage": _contract_amperage,
+        "contract_amperage": app.state.contract_amperage,
         "discord_configured": discord_notifier is not None,
         "nature_remo_enabled": _nature_remo_enabled,
         "nature_remo_configured": nature_remo_controller is not None,
@@ -255,7 +297,10 @@ async def update_settings(settings: SettingsUpdate):
     if settings.enabled is not None:
         _alert_enabled = settings.enabled
 
-    _save_settings()
+    # ファイル書き込みはイベントループを塞がないようスレッドで実行
+    data = _settings_data()
+    async with _settings_save_lock:
+        await asyncio.to_thread(_save_settings, data)
     return await get_settings()
 
 
@@ -306,7 +351,7 @@ async def test_nature_remo():
 async def websocket_power(websocket: WebSocket):
     """WebSocket: リアルタイム電力データ配信"""
     await websocket.accept()
-    connected_clients.append(websocket)
+    connected_clients.add(websocket)
 
     try:
         # 接続直後に現在値を送信
@@ -323,8 +368,8 @@ async def websocket_power(websocket: WebSocket):
     except WebSocketDisconnect:
         pass
     finally:
-        if websocket in connected_clients:
-            connected_clients.remove(websocket)
+        # ブロードキャスト側で削除済みの場合もあるのでdiscardで除去
+        connected_clients.discard(websocket)
 
 
 # --- ダッシュボード ---
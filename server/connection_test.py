@@ -36,21 +36,39 @@ def load_cache():
     return cache
 
 
+def read_line(ser, deadline):
+    """
+    期限まで1行の受信を待つ
+
+    readline()のタイムアウトで待機するので、行が届けばすぐに戻る
+    （in_waitingを見て0.1秒sleepするポーリングの遅延がない）
+
+    Returns:
+        受信した行（タイムアウト区切りで空文字の場合あり）。期限切れの場合はNone
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+    timeout = min(0.5, remaining)
+    if ser.timeout != timeout:
+        ser.timeout = timeout
+    return ser.readline().decode('utf-8', errors='ignore').strip()
+
+
 def send_cmd(ser, cmd, wait_for=None, timeout=10):
     """コマンド送信"""
     ser.write((cmd + '\r\n').encode())
     lines = []
-    start = time.time()
-    while time.time() - start < timeout:
-        if ser.in_waiting > 0:
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            if line:
-                print(f"  > {line}")
-                lines.append(line)
-                if wait_for and wait_for in line:
-                    break
-        else:
-            time.sleep(0.1)
+    deadline = time.monotonic() + timeout
+    while True:
+        line = read_line(ser, deadline)
+        if line is None:
+            break
+        if line:
+            print(f"  > {line}")
+            lines.append(line)
+            if wait_for and wait_for in line:
+                break
     return lines
 
 
@@ -87,21 +105,20 @@ def main():
         ser.write(f'SKJOIN {ipv6_addr}\r\n'.encode())
 
         connected = False
-        start = time.time()
-        while time.time() - start < 60:
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line:
-                    print(f"  > {line}")
-                if 'EVENT 25' in line:
-                    connected = True
-                    print("\n*** PANA Connection SUCCESS! ***")
-                    break
-                if 'EVENT 24' in line:
-                    print("\n*** PANA Connection FAILED ***")
-                    break
-            else:
-                time.sleep(0.1)
+        deadline = time.monotonic() + 60
+        while True:
+            line = read_line(ser, deadline)
+            if line is None:
+                break
+            if line:
+                print(f"  > {line}")
+            if 'EVENT 25' in line:
+                connected = True
+                print("\n*** PANA Connection SUCCESS! ***")
+                break
+            if 'EVENT 24' in line:
+                print("\n*** PANA Connection FAILED ***")
+                break
 
         if not connected:
             print("Connection timeout or failed")
@@ -132,19 +149,17 @@ def main():
             ser.write(cmd.encode() + frame)
 
             # 応答待ち
-            start = time.time()
-            while time.time() - start < 10:
-                if ser.in_waiting > 0:
-                    line = ser.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        if line.startswith('ERXUDP'):
-                            parts = line.split(' ')
-                            if len(parts) >= 10:
-                                data = parts[9]
-                                parse_echonet_response(data)
-                                break
-                else:
-                    time.sleep(0.1)
+            deadline = time.monotonic() + 10
+            while True:
+                line = read_line(ser, deadline)
+                if line is None:
+                    break
+                if line.startswith('ERXUDP'):
+                    parts = line.split(' ')
+                    if len(parts) >= 10:
+                        data = parts[9]
+                        parse_echonet_response(data)
+                        break
 
             time.sleep(2)  # 次のリクエストまで待つ
 
@@ -158,24 +173,24 @@ def main():
         # テセラ製モジュール: データの後にCRLFは送信しない
 
         # 応答待ち
-        start = time.time()
-        while time.time() - start < 15:
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line:
-                    elapsed = time.time() - start
-                    print(f"  [{elapsed:.1f}s] {line}")
-
-                    if line.startswith('ERXUDP'):
-                        parts = line.split(' ')
-                        if len(parts) >= 9:
-                            # ERXUDP形式: SENDER DEST RPORT LPORT MACADDR SEC SIDE DATALEN DATA
-                            # データは最後のフィールド（インデックス9）
-                            data = parts[9] if len(parts) > 9 else parts[8]
-                            print(f"\n  ECHONET Lite Data: {data}")
-                            parse_echonet_response(data)
-            else:
-                time.sleep(0.1)
+        start = time.monotonic()
+        deadline = start + 15
+        while True:
+            line = read_line(ser, deadline)
+            if line is None:
+                break
+            if line:
+                elapsed = time.monotonic() - start
+                print(f"  [{elapsed:.1f}s] {line}")
+
+                if line.startswith('ERXUDP'):
+                    parts = line.split(' ')
+                    if len(parts) >= 9:
+                        # ERXUDP形式: SENDER DEST RPORT LPORT MACADDR SEC SIDE DATALEN DATA
+                        # データは最後のフィールド（インデックス9）
+                        data = parts[9] if len(parts) > 9 else parts[8]
+                        print(f"\n  ECHONET Lite Data: {data}")
+                        parse_echonet_response(data)
 
     finally:
         ser.close()
@@ -221,9 +236,8 @@ def parse_echonet_response(data):
             print(f"  Property[{i}]: EPC={epc}, PDC={pdc}, EDT={edt}")
 
             if epc.upper() == 'E7' and pdc == 4:
-                power = int(edt, 16)
-                if power >= 0x80000000:
-                    power -= 0x100000000
+                # 符号付き32ビット整数（売電時は負）
+                power = int.from_bytes(bytes.fromhex(edt), 'big', signed=True)
                 print(f"\n  *** Instant Power: {power} W ***")
 
             pos += 4 + pdc * 2
@@ -4,9 +4,11 @@ Discord Webhook通知クライアント
 Discord Webhookを使用して通知を送信するモジュール
 """
 
+import asyncio
 import logging
+import random
 import time
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
 import aiohttp
 
@@ -14,19 +16,61 @@ import aiohttp
 class DiscordNotifier:
     """Discord Webhookで通知を送信するクライアント"""
 
+    # リトライ対象のステータス（レート制限・一時的なサーバーエラー）
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    # これより長いRetry-Afterは待たずに諦める（古いアラートを大きく遅れて送らないため）
+    MAX_RETRY_DELAY = 10.0
+
     def __init__(
         self,
         webhook_url: str,
         cooldown_minutes: int = 5,
+        max_retries: int = 2,
+        retry_base_seconds: float = 1.0,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+        session_factory: Callable[..., aiohttp.ClientSession] = aiohttp.ClientSession,
     ):
         """
         Args:
             webhook_url: Discord Webhook URL
             cooldown_minutes: 通知間隔（分）
+            max_retries: 一時的なエラー時のリトライ回数
+            retry_base_seconds: リトライ間隔の基準値（秒、試行ごとに倍増）
+            sleep: リトライ待ちに使う関数（テストで差し替え可能）
+            session_factory: ClientSessionの生成関数（テストで差し替え可能）
         """
         self.webhook_url = webhook_url
         self.cooldown_seconds = cooldown_minutes * 60
-        self._last_notification_time: float = 0
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self._sleep = sleep
+        self._session_factory = session_factory
+        # 最終送信時刻（time.monotonic基準、未送信ならNone）
+        self._last_notification_time: Optional[float] = None
+        # Webhookは常に同じホストなので、セッションを使い回して接続を再利用する
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """使い回すClientSessionを取得（未作成・クローズ済みなら作成）"""
+        if self._session is None or self._session.closed:
+            self._session = self._session_factory()
+        return self._session
+
+    async def aclose(self):
+        """ClientSessionをクローズ"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _retry_delay(self, response: aiohttp.ClientResponse, attempt: int) -> float:
+        """リトライまでの待機秒数（Retry-Afterがあれば優先、なければジッター付き指数バックオフ）"""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.retry_base_seconds * (2 ** attempt) + random.random() * 0.1
 
     async def send(
         self,
@@ -45,13 +89,13 @@ class DiscordNotifier:
         Returns:
             送信成功時True
         """
-        # クールダウンチェック
-        now = time.time()
-        if not skip_cooldown and now - self._last_notification_time < self.cooldown_seconds:
-            remaining = int(
-                self.cooldown_seconds - (now - self._last_notification_time)
-            )
-            logging.debug(f"Discord cooldown: {remaining}s remaining")
+        # クールダウンチェック（NTPによる時刻補正の影響を受けないmonotonicで判定）
+        now = time.monotonic()
+        last = self._last_notification_time
+        if not skip_cooldown and last is not None and now - last < self.cooldown_seconds:
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                remaining = int(self.cooldown_seconds - (now - last))
+                logging.debug(f"Discord cooldown: {remaining}s remaining")
             return False
 
         if not skip_cooldown:
@@ -69,8 +113,8 @@ class DiscordNotifier:
         }
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
+            for attempt in range(self.max_retries + 1):
+                async with self._get_session().post(
                     self.webhook_url,
                     json=payload,
                     timeout=aiohttp.ClientTimeout(total=10),
@@ -78,11 +122,22 @@ class DiscordNotifier:
                     if response.status == 204:
                         logging.info("Discord notification sent")
                         return True
-                    else:
+
+                    delay = self._retry_delay(response, attempt)
+                    if (
+                        response.status not in self.RETRY_STATUSES
+                        or attempt == self.max_retries
+                        or delay > self.MAX_RETRY_DELAY
+                    ):
                         logging.warning(
                             f"Discord webhook failed: {response.status}"
                         )
                         return False
+
+                logging.warning(
+                    f"Discord webhook returned {response.status}, retrying in {delay:.1f}s"
+                )
+                await self._sleep(delay)
         except Exception as e:
             logging.error(f"Discord webhook error: {e}")
             return False
@@ -65,7 +65,7 @@ except ImportError:
     print("BルートID/パスワードを設定してください")
     sys.exit(1)
 
-from api import app, update_power_data, broadcast_power_data, set_mock_mode, check_and_notify, update_connection_info, set_contract_amperage, set_nature_remo_enabled
+from api import app, update_power_data, broadcast_power_data, set_mock_mode, notify_in_background, update_connection_info, set_contract_amperage, set_nature_remo_enabled
 import api
 from discord_notifier import create_discord_notifier
 from nature_remo_controller import create_nature_remo_controller
@@ -121,16 +121,22 @@ def create_client(mock_mode: bool):
 # グローバル変数
 wisun_client = None
 running = True
+# 実行中のシリアル通信（スレッド）。終了時にポートを閉じる前に完了を待つ
+poll_task: asyncio.Task | None = None
 
 
 async def power_loop():
     """電力データ取得ループ（3秒ごと）"""
-    global wisun_client, running
+    global wisun_client, running, poll_task
 
     while running:
         try:
             if wisun_client:
-                data = wisun_client.get_power_data()
+                # シリアル通信はブロッキング（応答待ち最大5秒、再接続時はSKJOINで最大30秒）なので
+                # APIサーバーのイベントループを止めないようスレッドで実行
+                # スレッドは途中で止められないので、ループのキャンセルから切り離して完了を追跡する
+                poll_task = asyncio.create_task(asyncio.to_thread(wisun_client.get_power_data))
+                data = await asyncio.shield(poll_task)
                 power = data.get("instant_power")
 
                 # 接続情報更新（電力値に関わらず更新）
@@ -141,7 +147,8 @@ async def power_loop():
                 if power is not None:
                     update_power_data(power)
                     await broadcast_power_data()
-                    await check_and_notify(power)
+                    # 通知（リトライで数十秒かかることがある）は待たずに次のポーリングへ
+                    notify_in_background(power)
                     logging.info(f"Power: {power}W")
                 else:
                     logging.warning("Power data is None")
@@ -222,9 +229,8 @@ async def main():
         if attempt < max_retries - 1:
             logging.info(f"Retrying in {retry_delay} seconds...")
             await asyncio.sleep(retry_delay)
-            # クライアント再作成
+            # ポートを閉じて同じクライアントで再試行（取得済みの接続情報は引き継ぐ）
             wisun_client.close()
-            wisun_client = create_client(mock_mode)
             if not mock_mode:
                 logging.info(f"Connecting to Wi-SUN adapter ({config.SERIAL_PORT})...")
     else:
@@ -262,10 +268,23 @@ async def main():
         running = False
         power_task.cancel()
         # energy_task.cancel()  # 無効化
+        await asyncio.gather(power_task, return_exceptions=True)
+
+        # 通信中のスレッドが終わってからポートを閉じる（select/read中に閉じるとEBADF等になる）
+        if poll_task is not None and not poll_task.done():
+            logging.info("Waiting for the in-flight serial poll to finish...")
+            await asyncio.gather(poll_task, return_exceptions=True)
 
         if wisun_client:
             wisun_client.close()
 
+        # 送信中のアラート通知を止めてからセッションを閉じる
+        if api._alert_task is not None:
+            api._alert_task.cancel()
+
+        if api.discord_notifier:
+            await api.discord_notifier.aclose()
+
         print("\nServer stopped")
 
 
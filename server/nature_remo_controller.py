@@ -6,7 +6,7 @@ from __future__ import annotations
 
 import logging
 import time
-from typing import Optional
+from typing import Callable, Optional
 
 import aiohttp
 
@@ -21,10 +21,12 @@ class NatureRemoController:
         access_token: str,
         cooldown_minutes: int = 5,
         actions: Optional[list] = None,
+        session_factory: Callable[..., aiohttp.ClientSession] = aiohttp.ClientSession,
     ):
         self.access_token = access_token
         self.cooldown_seconds = cooldown_minutes * 60
         self.actions = actions or []
+        self._session_factory = session_factory
         self._last_action_time: float = 0
 
     def _headers(self) -> dict:
@@ -68,7 +70,7 @@ class NatureRemoController:
             self._last_action_time = now
 
         all_success = True
-        async with aiohttp.ClientSession() as session:
+        async with self._session_factory() as session:
             for action in self.actions:
                 ok = await self._execute_action(session, action)
                 if not ok:
@@ -124,7 +126,7 @@ class NatureRemoController:
 
         url = f"{self.BASE_URL}/appliances"
         try:
-            async with aiohttp.ClientSession() as session:
+            async with self._session_factory() as session:
                 async with session.get(
                     url,
                     headers=self._headers(),
@@ -11,23 +11,42 @@ import time
 import config
 
 
+def read_line(ser, deadline):
+    """
+    期限まで1行の受信を待つ
+
+    readline()のタイムアウトで待機するので、行が届けばすぐに戻る
+    （in_waitingを見て0.1秒sleepするポーリングの遅延がない）
+
+    Returns:
+        受信した行（タイムアウト区切りで空文字の場合あり）。期限切れの場合はNone
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+    timeout = min(0.5, remaining)
+    if ser.timeout != timeout:
+        ser.timeout = timeout
+    return ser.readline().decode('utf-8', errors='ignore').strip()
+
+
 def send_cmd(ser, cmd, wait_for=None, timeout=10):
     """コマンド送信（応答を全て表示）"""
     print(f"<< {cmd}")
     ser.write((cmd + '\r\n').encode())
     lines = []
-    start = time.time()
-    while time.time() - start < timeout:
-        if ser.in_waiting > 0:
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            if line:
-                elapsed = time.time() - start
-                print(f"  [{elapsed:5.1f}s] >> {line}")
-                lines.append(line)
-                if wait_for and wait_for in line:
-                    break
-        else:
-            time.sleep(0.1)
+    start = time.monotonic()
+    deadline = start + timeout
+    while True:
+        line = read_line(ser, deadline)
+        if line is None:
+            break
+        if line:
+            elapsed = time.monotonic() - start
+            print(f"  [{elapsed:5.1f}s] >> {line}")
+            lines.append(line)
+            if wait_for and wait_for in line:
+                break
     return lines
 
 
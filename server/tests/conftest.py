@@ -0,0 +1,48 @@
+"""
+共通フィクスチャ
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+
+# serverディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api import app
+
+# uvloopが使える環境ではテストのイベントループもuvloopにする
+if sys.platform != "win32":
+    try:
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+@pytest_asyncio.fixture(scope="session")
+async def client():
+    """セッション全体で共有するAsyncClient"""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--runslow", action="store_true", default=False, help="slowマーカー付きのテストも実行"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """--runslow 指定がなければslowマーカー付きのテストをスキップ"""
+    if config.getoption("--runslow"):
+        return
+    skip_slow = pytest.mark.skip(reason="--runslow 指定時のみ実行")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
@@ -5,10 +5,14 @@ REST API と WebSocket のテスト
 """
 
 import pytest
-from httpx import AsyncClient, ASGITransport
+import pytest_asyncio
 
+import asyncio
+import json
 import sys
+from datetime import datetime
 from pathlib import Path
+from types import MappingProxyType
 
 # serverディレクトリをパスに追加
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -33,17 +37,25 @@ from api import (
 import api
 
 
-@pytest.fixture(autouse=True)
-def reset_state():
-    """各テスト前に状態をリセット"""
-    current_data["instant_power"] = None
-    current_data["timestamp"] = None
-    connection_info["channel"] = None
-    connection_info["pan_id"] = None
-    connection_info["mac_addr"] = None
-    connection_info["ipv6_addr"] = None
-    connection_info["rssi"] = None
-    connection_info["rssi_quality"] = None
+# 状態の初期値
+_CURRENT_DATA_DEFAULTS = MappingProxyType({
+    "instant_power": None,
+    "timestamp": None,
+})
+_CONNECTION_INFO_DEFAULTS = MappingProxyType({
+    "channel": None,
+    "pan_id": None,
+    "mac_addr": None,
+    "ipv6_addr": None,
+    "rssi": None,
+    "rssi_quality": None,
+})
+
+
+def _reset_state():
+    """APIの状態を初期値に戻す"""
+    current_data.update(_CURRENT_DATA_DEFAULTS)
+    connection_info.update(_CONNECTION_INFO_DEFAULTS)
     history.clear()
     connected_clients.clear()
     set_mock_mode(False)
@@ -53,86 +65,107 @@ def reset_state():
     set_nature_remo_enabled(False)
     api.discord_notifier = None
     api.nature_remo_controller = None
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    """各テスト前に状態をリセット"""
+    _reset_state()
     yield
 
 
-@pytest.fixture
-def transport():
-    """ASGITransportを作成"""
-    return ASGITransport(app=app)
+@pytest.fixture(autouse=True)
+def settings_file(tmp_path, monkeypatch):
+    """設定ファイルの保存先をテストごとの一時ディレクトリに差し替え"""
+    path = tmp_path / "settings.json"
+    monkeypatch.setattr(api, "_settings_file", path)
+    return path
+
+
+# update_power_data が記録する固定時刻
+FROZEN_NOW = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def freeze_time(monkeypatch):
+    """api.datetime.now() を固定時刻に差し替え"""
+    class FrozenDatetime:
+        @staticmethod
+        def now(tz=None):
+            return FROZEN_NOW
+
+    monkeypatch.setattr(api, "datetime", FrozenDatetime)
+
+
+def seed_history(powers):
+    """履歴に複数件をまとめて追加（update_power_dataを1件ずつ呼ばない）"""
+    timestamp = FROZEN_NOW.isoformat()
+    history.extend({"instant_power": p, "timestamp": timestamp} for p in powers)
+
+
+def jloads(response):
+    """レスポンスボディをパース（httpxのエンコーディング推定を経由しない）"""
+    return json.loads(response.content)
 
 
 # --- REST API Tests ---
 
 
-@pytest.mark.asyncio
-async def test_get_power_initial(transport):
+async def test_get_power_initial(client):
     """初期状態では全てNone"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/power")
+    response = await client.get("/api/power")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data["instant_power"] is None
     assert data["timestamp"] is None
 
 
-@pytest.mark.asyncio
-async def test_get_power_after_update(transport):
+async def test_get_power_after_update(client):
     """update_power_data後は値が取得できる"""
     update_power_data(1500)
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/power")
+    response = await client.get("/api/power")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data["instant_power"] == 1500
-    assert data["timestamp"] is not None
+    assert data["timestamp"] == "2024-01-01T12:00:00"
 
 
-@pytest.mark.asyncio
-async def test_get_history_empty(transport):
+async def test_get_history_empty(client):
     """履歴が空の場合は空リストを返す"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/history")
+    response = await client.get("/api/history")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data == []
 
 
-@pytest.mark.asyncio
-async def test_get_history_with_data(transport):
+async def test_get_history_with_data(client):
     """履歴データの取得"""
     # 3件のデータを追加
-    update_power_data(1000)
-    update_power_data(1500)
-    update_power_data(2000)
+    seed_history([1000, 1500, 2000])
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/history")
+    response = await client.get("/api/history")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert len(data) == 3
     assert data[0]["instant_power"] == 1000
     assert data[1]["instant_power"] == 1500
     assert data[2]["instant_power"] == 2000
 
 
-@pytest.mark.asyncio
-async def test_get_history_with_limit(transport):
+async def test_get_history_with_limit(client):
     """limitパラメータで件数制限"""
     # 5件のデータを追加
-    for i in range(5):
-        update_power_data(1000 + i * 100)
+    seed_history([1000, 1100, 1200, 1300, 1400])
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/history?limit=3")
+    response = await client.get("/api/history?limit=3")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert len(data) == 3
     # 最新の3件が取得される
     assert data[0]["instant_power"] == 1200
@@ -140,14 +173,12 @@ async def test_get_history_with_limit(transport):
     assert data[2]["instant_power"] == 1400
 
 
-@pytest.mark.asyncio
-async def test_get_status(transport):
+async def test_get_status(client):
     """ステータス情報の確認"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/status")
+    response = await client.get("/api/status")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data["status"] == "running"
     assert data["mock_mode"] is False
     assert data["history_count"] == 0
@@ -155,44 +186,38 @@ async def test_get_status(transport):
     assert data["last_update"] is None
 
 
-@pytest.mark.asyncio
-async def test_get_status_with_mock_mode(transport):
+async def test_get_status_with_mock_mode(client):
     """mockモードがステータスに反映される"""
     set_mock_mode(True)
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/status")
+    response = await client.get("/api/status")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data["mock_mode"] is True
 
 
-@pytest.mark.asyncio
-async def test_get_status_with_data(transport):
+async def test_get_status_with_data(client):
     """データ追加後のステータス"""
     update_power_data(1500)
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/status")
+    response = await client.get("/api/status")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data["history_count"] == 1
-    assert data["last_update"] is not None
+    assert data["last_update"] == "2024-01-01T12:00:00"
 
 
 # --- Connection Info API Tests ---
 
 
-@pytest.mark.asyncio
-async def test_get_connection_initial(transport):
+async def test_get_connection_initial(client):
     """初期状態では接続情報は全てNone"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/connection")
+    response = await client.get("/api/connection")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data["channel"] is None
     assert data["pan_id"] is None
     assert data["mac_addr"] is None
@@ -201,8 +226,7 @@ async def test_get_connection_initial(transport):
     assert data["rssi_quality"] is None
 
 
-@pytest.mark.asyncio
-async def test_get_connection_after_update(transport):
+async def test_get_connection_after_update(client):
     """update_connection_info後は値が取得できる"""
     update_connection_info({
         "channel": "31",
@@ -213,11 +237,10 @@ async def test_get_connection_after_update(transport):
         "rssi_quality": "excellent",
     })
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/connection")
+    response = await client.get("/api/connection")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data["channel"] == "31"
     assert data["pan_id"] == "A91B"
     assert data["mac_addr"] == "C2F94500408AA91B"
@@ -226,30 +249,26 @@ async def test_get_connection_after_update(transport):
     assert data["rssi_quality"] == "excellent"
 
 
-@pytest.mark.asyncio
-async def test_get_connection_partial_update(transport):
+async def test_get_connection_partial_update(client):
     """部分的な更新でも動作する"""
     update_connection_info({
         "rssi": -65,
         "rssi_quality": "good",
     })
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/connection")
+    response = await client.get("/api/connection")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data["rssi"] == -65
     assert data["rssi_quality"] == "good"
     # 更新していないフィールドはNoneのまま
     assert data["channel"] is None
 
 
-@pytest.mark.asyncio
-async def test_dashboard(transport):
+async def test_dashboard(client):
     """ダッシュボードHTMLレスポンス"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/")
+    response = await client.get("/")
 
     assert response.status_code == 200
     assert "text/html" in response.headers["content-type"]
@@ -258,233 +277,153 @@ async def test_dashboard(transport):
 # --- WebSocket Tests ---
 
 
-@pytest.mark.asyncio
+@pytest.mark.slow
 async def test_websocket_connection():
     """WebSocket接続と初期データ受信"""
-    from starlette.testclient import TestClient
-
     # 初期データを設定
     update_power_data(1500)
 
-    with TestClient(app) as client:
-        with client.websocket_connect("/ws/power") as websocket:
-            # 接続直後に現在値が送信される
-            data = websocket.receive_json()
-            assert data["instant_power"] == 1500
-
-
-# --- MockWiSUNClient Tests ---
-
-
-def test_mock_client_connect():
-    """MockWiSUNClientの接続テスト"""
-    from mock_client import MockWiSUNClient
-
-    client = MockWiSUNClient()
-    assert client.connect() is True
-
-
-def test_mock_client_get_power_data():
-    """MockWiSUNClientのデータ生成テスト"""
-    from mock_client import MockWiSUNClient
-
-    client = MockWiSUNClient()
-    client.connect()
-
-    data = client.get_power_data()
-
-    # 必要なキーが存在する
-    assert "instant_power" in data
-
-    # 値が妥当な範囲
-    assert isinstance(data["instant_power"], int)
-    assert data["instant_power"] > 0
-
-
-def test_mock_client_power_variation():
-    """MockWiSUNClientが変動するデータを生成することを確認"""
-    from mock_client import MockWiSUNClient
-
-    client = MockWiSUNClient()
-    client.connect()
-
-    # 10回データを取得して、全て同じ値ではないことを確認
-    powers = [client.get_power_data()["instant_power"] for _ in range(10)]
-    unique_powers = set(powers)
-
-    # ランダムノイズがあるので、10回中少なくとも2つは異なる値になるはず
-    assert len(unique_powers) > 1
-
-
-def test_mock_client_get_connection_info():
-    """MockWiSUNClientの接続情報取得テスト"""
-    from mock_client import MockWiSUNClient
-
-    client = MockWiSUNClient()
-    client.connect()
-
-    info = client.get_connection_info()
-
-    # 必要なキーが存在する
-    assert "channel" in info
-    assert "pan_id" in info
-    assert "mac_addr" in info
-    assert "ipv6_addr" in info
-    assert "rssi" in info
-    assert "rssi_quality" in info
-
-    # 値が設定されている
-    assert info["channel"] == "33"
-    assert info["pan_id"] == "MOCK"
-    assert info["mac_addr"] == "MOCK00000001"
-    assert info["ipv6_addr"].startswith("FE80:")
-
-    # RSSIは妥当な範囲 (-80 ~ -50)
-    assert isinstance(info["rssi"], int)
-    assert -80 <= info["rssi"] <= -50
-
-    # rssi_qualityは有効な値
-    assert info["rssi_quality"] in ["excellent", "good", "fair", "poor"]
-
-
-def test_mock_client_connection_info_rssi_quality():
-    """RSSIに応じたrssi_qualityの判定テスト"""
-    from mock_client import MockWiSUNClient
-
-    client = MockWiSUNClient()
-    client.connect()
-
-    # 10回取得してrssi_qualityがRSSI値と一致するか確認
-    for _ in range(10):
-        info = client.get_connection_info()
-        rssi = info["rssi"]
-        quality = info["rssi_quality"]
-
-        if rssi >= -60:
-            assert quality == "excellent"
-        elif rssi >= -70:
-            assert quality == "good"
-        elif rssi >= -80:
-            assert quality == "fair"
-        else:
-            assert quality == "poor"
+    # ASGIのWebSocketスコープを直接駆動（同じイベントループ上で実行）
+    scope = {
+        "type": "websocket",
+        "asgi": {"version": "3.0"},
+        "scheme": "ws",
+        "path": "/ws/power",
+        "raw_path": b"/ws/power",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("test", 80),
+        "client": ("testclient", 50000),
+        "subprotocols": [],
+    }
+    to_app: asyncio.Queue = asyncio.Queue()
+    from_app: asyncio.Queue = asyncio.Queue()
+    await to_app.put({"type": "websocket.connect"})
+    task = asyncio.create_task(app(scope, to_app.get, from_app.put))
+
+    message = await asyncio.wait_for(from_app.get(), timeout=5)
+    assert message["type"] == "websocket.accept"
+
+    # 接続直後に現在値が送信される
+    message = await asyncio.wait_for(from_app.get(), timeout=5)
+    data = json.loads(message["text"])
+    assert data["instant_power"] == 1500
 
+    # 切断するとクライアント一覧から削除される
+    await to_app.put({"type": "websocket.disconnect", "code": 1000})
+    await asyncio.wait_for(task, timeout=5)
+    assert len(connected_clients) == 0
 
-def test_mock_client_get_energy_data():
-    """MockWiSUNClientの積算電力量取得テスト"""
-    from mock_client import MockWiSUNClient
 
-    client = MockWiSUNClient()
-    client.connect()
+async def test_broadcast_removes_disconnected_clients():
+    """送信に失敗したクライアントはブロードキャスト後に削除される"""
+    class DummyClient:
+        def __init__(self, fail=False):
+            self.fail = fail
+            self.sent = []
 
-    data = client.get_energy_data()
+        async def send_text(self, data):
+            if self.fail:
+                raise RuntimeError("disconnected")
+            self.sent.append(data)
 
-    # 必要なキーが存在する
-    assert "cumulative_energy" in data
-    assert "cumulative_energy_reverse" in data
-    assert "fixed_energy" in data
-    assert "energy_unit" in data
+    alive = DummyClient()
+    dead = DummyClient(fail=True)
+    connected_clients.update([dead, alive])
+    update_power_data(1500)
 
-    # 値が設定されている
-    assert isinstance(data["cumulative_energy"], float)
-    assert data["cumulative_energy"] > 0
-    assert isinstance(data["cumulative_energy_reverse"], float)
-    assert data["energy_unit"] == 0.1
+    await api.broadcast_power_data()
 
-    # fixed_energyの構造確認
-    assert "timestamp" in data["fixed_energy"]
-    assert "energy" in data["fixed_energy"]
+    assert connected_clients == {alive}
+    assert json.loads(alive.sent[0])["instant_power"] == 1500
 
 
 # --- Settings API Tests ---
 
 
-@pytest.mark.asyncio
-async def test_get_settings_default(transport):
-    """デフォルト設定の取得"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/settings")
-
-    assert response.status_code == 200
-    data = response.json()
-    assert data["alert_threshold"] == 4000
-    assert data["alert_enabled"] is True
-
-
-@pytest.mark.asyncio
-async def test_update_settings_threshold(transport):
-    """閾値の更新"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.post(
-            "/api/settings",
-            json={"threshold": 3000}
-        )
-
+@pytest_asyncio.fixture(scope="module")
+async def settings_json(client):
+    """初期状態の GET /api/settings（モジュール内で1回だけ取得）"""
+    _reset_state()
+    response = await client.get("/api/settings")
     assert response.status_code == 200
-    data = response.json()
-    assert data["alert_threshold"] == 3000
-    assert data["alert_enabled"] is True
+    return jloads(response)
 
 
-@pytest.mark.asyncio
-async def test_update_settings_enabled(transport):
-    """通知有効/無効の更新"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.post(
-            "/api/settings",
-            json={"enabled": False}
-        )
+def test_get_settings_default(settings_json):
+    """デフォルト設定の取得"""
+    assert settings_json["alert_threshold"] == 4000
+    assert settings_json["alert_enabled"] is True
+
+
+@pytest.mark.parametrize(
+    "body,expect",
+    [
+        pytest.param(
+            {"threshold": 3000},
+            {"alert_threshold": 3000, "alert_enabled": True},
+            id="threshold",
+        ),
+        pytest.param(
+            {"enabled": False},
+            {"alert_enabled": False},
+            id="enabled",
+        ),
+        pytest.param(
+            {"threshold": 5000, "enabled": False},
+            {"alert_threshold": 5000, "alert_enabled": False},
+            id="both",
+        ),
+    ],
+)
+async def test_update_settings(client, settings_file, body, expect):
+    """閾値・通知有効/無効の更新"""
+    response = await client.post("/api/settings", json=body)
 
     assert response.status_code == 200
-    data = response.json()
-    assert data["alert_enabled"] is False
+    assert expect.items() <= jloads(response).items()
 
+    # 設定ファイルにも保存される
+    saved = json.loads(settings_file.read_text())
+    assert expect.items() <= saved.items()
+    assert not settings_file.with_suffix(".tmp").exists()
 
-@pytest.mark.asyncio
-async def test_update_settings_both(transport):
-    """閾値と有効/無効を同時に更新"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.post(
-            "/api/settings",
-            json={"threshold": 5000, "enabled": False}
-        )
 
-    assert response.status_code == 200
-    data = response.json()
-    assert data["alert_threshold"] == 5000
-    assert data["alert_enabled"] is False
+# --- Static Files Tests (PWA) ---
 
 
-# --- Static Files Tests (PWA) ---
+@pytest_asyncio.fixture(scope="session")
+async def static_assets(client):
+    """PWA用静的ファイルのレスポンス（セッション内で1回だけ取得）"""
+    return {
+        "manifest": await client.get("/static/manifest.json"),
+        "sw": await client.get("/static/sw.js"),
+        "icon": await client.get("/static/icon-192.png"),
+    }
 
 
-@pytest.mark.asyncio
-async def test_manifest_json(transport):
+def test_manifest_json(static_assets):
     """manifest.jsonが取得できる"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/static/manifest.json")
+    response = static_assets["manifest"]
 
     assert response.status_code == 200
-    data = response.json()
-    assert "name" in data
-    assert "icons" in data
+    body = response.content
+    assert b'"name"' in body
+    assert b'"icons"' in body
 
 
-@pytest.mark.asyncio
-async def test_service_worker(transport):
+def test_service_worker(static_assets):
     """Service Workerが取得できる"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/static/sw.js")
+    response = static_assets["sw"]
 
     assert response.status_code == 200
     assert "javascript" in response.headers["content-type"]
 
 
-@pytest.mark.asyncio
-async def test_app_icon(transport):
+def test_app_icon(static_assets):
     """アプリアイコンが取得できる"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/static/icon-192.png")
+    response = static_assets["icon"]
 
     assert response.status_code == 200
     assert "image/png" in response.headers["content-type"]
@@ -493,85 +432,123 @@ async def test_app_icon(transport):
 # --- Contract Amperage Tests ---
 
 
-@pytest.mark.asyncio
-async def test_get_settings_includes_contract_amperage(transport):
+def test_get_settings_includes_contract_amperage(settings_json):
     """設定に契約アンペアが含まれる"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/settings")
+    assert "contract_amperage" in settings_json
+    assert settings_json["contract_amperage"] == 40  # デフォルト値
 
-    assert response.status_code == 200
-    data = response.json()
-    assert "contract_amperage" in data
-    assert data["contract_amperage"] == 40  # デフォルト値
 
-
-@pytest.mark.asyncio
-async def test_contract_amperage_is_positive(transport):
+def test_contract_amperage_is_positive(settings_json):
     """契約アンペアは正の整数"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/settings")
-
-    assert response.status_code == 200
-    data = response.json()
-    assert isinstance(data["contract_amperage"], int)
-    assert data["contract_amperage"] > 0
+    assert isinstance(settings_json["contract_amperage"], int)
+    assert settings_json["contract_amperage"] > 0
 
 
-@pytest.mark.asyncio
-async def test_contract_amperage_not_null(transport):
+def test_contract_amperage_not_null(settings_json):
     """契約アンペアはNoneではない"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/settings")
-
-    assert response.status_code == 200
-    data = response.json()
-    assert data["contract_amperage"] is not None
+    assert settings_json["contract_amperage"] is not None
 
 
 def test_set_contract_amperage():
     """契約アンペアの設定"""
     set_contract_amperage(60)
-    assert api._contract_amperage == 60
+    assert app.state.contract_amperage == 60
 
     set_contract_amperage(30)
-    assert api._contract_amperage == 30
+    assert app.state.contract_amperage == 30
 
 
 # --- Discord Notify API Tests ---
 
 
-@pytest.mark.asyncio
-async def test_get_notify_status_without_notifier(transport):
+async def test_get_notify_status_without_notifier(client):
     """DiscordNotifier未設定時のステータス"""
     api.discord_notifier = None
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/notify/status")
+    response = await client.get("/api/notify/status")
 
     assert response.status_code == 200
-    data = response.json()
+    data = jloads(response)
     assert data["discord_configured"] is False
 
 
-@pytest.mark.asyncio
-async def test_notify_test_without_notifier(transport):
-    """DiscordNotifier未設定時のテスト送信"""
+@pytest.mark.parametrize(
+    "path,error",
+    [
+        ("/api/notify/test", "Discord not configured"),
+        ("/api/nature-remo/test", "Nature Remo not configured"),
+    ],
+)
+async def test_test_endpoint_without_backend(client, path, error):
+    """通知先/制御先が未設定時のテスト実行"""
     api.discord_notifier = None
+    api.nature_remo_controller = None
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.post("/api/notify/test")
+    response = await client.post(path)
 
     assert response.status_code == 200
-    data = response.json()
-    assert "error" in data
+    data = jloads(response)
+    assert data["error"] == error
 
 
-@pytest.mark.asyncio
-async def test_settings_includes_discord_info(transport):
+def test_settings_includes_discord_info(settings_json):
     """設定APIにDiscord情報が含まれる"""
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.get("/api/settings")
+    assert "discord_configured" in settings_json
 
-    assert response.status_code == 200
-    data = response.json()
-    assert "discord_configured" in data
+
+# --- Alert Tests ---
+
+
+async def test_check_and_notify_runs_discord_and_nature_remo_concurrently():
+    """Discord通知とNature Remo制御が並行して実行される"""
+    remo_started = asyncio.Event()
+
+    class DummyNotifier:
+        async def send(self, message, title=None):
+            # Nature Remo側が開始するまで待つ（直列実行ならタイムアウトする）
+            await remo_started.wait()
+            return True
+
+    class DummyController:
+        async def execute_actions(self, skip_cooldown=False):
+            remo_started.set()
+            return True
+
+    api.discord_notifier = DummyNotifier()
+    api.nature_remo_controller = DummyController()
+    set_alert_threshold(1000)
+    set_alert_enabled(True)
+    set_nature_remo_enabled(True)
+
+    await asyncio.wait_for(api.check_and_notify(1500), timeout=1)
+
+
+async def test_notify_in_background_does_not_block():
+    """通知の完了を待たずに戻り、実行中は次の通知を重ねて開始しない"""
+    release = asyncio.Event()
+    sent = []
+
+    class SlowNotifier:
+        async def send(self, message, title=None):
+            # リトライ待ちで長引く送信の代わり
+            await release.wait()
+            sent.append(message)
+            return True
+
+    api.discord_notifier = SlowNotifier()
+    api.nature_remo_controller = None
+    set_alert_threshold(1000)
+    set_alert_enabled(True)
+    set_nature_remo_enabled(False)
+
+    task = api.notify_in_background(1500)
+    assert task is not None
+    await asyncio.sleep(0)
+    assert not task.done()
+    assert api.notify_in_background(1600) is None
+
+    release.set()
+    await asyncio.wait_for(task, timeout=1)
+    assert len(sent) == 1
+    assert api.notify_in_background(1700) is not None
+    await asyncio.wait_for(api._alert_task, timeout=1)
@@ -0,0 +1,36 @@
+"""
+ベンチマーク
+
+ダッシュボードが毎回ポーリングする電力値取得経路の性能を計測
+`pytest --runslow --benchmark-enable --benchmark-only` で実行
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# serverディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api import app, update_power_data
+
+
+@pytest.fixture(scope="module")
+def client_sync():
+    """同期テストクライアント"""
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark(group="power-read", min_rounds=100, warmup=True)
+def test_bench_power_read(benchmark, client_sync):
+    """update_power_data + GET /api/power"""
+    def run():
+        update_power_data(1500)
+        return client_sync.get("/api/power")
+
+    response = benchmark(run)
+    assert response.status_code == 200
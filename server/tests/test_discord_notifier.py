@@ -0,0 +1,112 @@
+"""
+Discord 通知のユニットテスト
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# serverディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from discord_notifier import DiscordNotifier, create_discord_notifier
+
+
+class FakeResponse:
+    def __init__(self, status=204, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class FakeSession:
+    def __init__(self, status=204, responses=None):
+        self.status = status
+        # 指定があれば順番に返すレスポンス
+        self.responses = list(responses or [])
+        self.post_count = 0
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    def post(self, *args, **kwargs):
+        self.post_count += 1
+        if self.responses:
+            return self.responses.pop(0)
+        return FakeResponse(status=self.status)
+
+
+# (ID, 前回送信からの経過（分）, 期待値)
+CASES: list[tuple[str, int | None, bool]] = [
+    ("initial", None, True),          # 初回は送信できる
+    ("cooldown", 0, False),           # 直後はクールダウン中
+    ("cooldown_expired", -10, True),  # クールダウン経過後は送信できる
+]
+
+
+@pytest.mark.parametrize(
+    "delta_min,expected",
+    [pytest.param(*c[1:], id=c[0]) for c in CASES],
+)
+async def test_notifier_cooldown(delta_min, expected):
+    notifier = DiscordNotifier(
+        webhook_url="https://example.com/webhook", cooldown_minutes=5, session_factory=FakeSession
+    )
+    if delta_min is not None:
+        notifier._last_notification_time = time.monotonic() + delta_min * 60
+
+    assert await notifier.send("test") is expected
+
+
+def test_create_notifier_without_webhook_url():
+    assert create_discord_notifier(webhook_url="") is None
+
+
+async def test_notifier_reuses_session():
+    notifier = DiscordNotifier(webhook_url="https://example.com/webhook", session_factory=FakeSession)
+    assert await notifier.send("first", skip_cooldown=True) is True
+    session = notifier._session
+    assert await notifier.send("second", skip_cooldown=True) is True
+    assert notifier._session is session
+
+    await notifier.aclose()
+    assert session.closed is True
+    assert notifier._session is None
+
+
+@pytest.mark.parametrize(
+    "responses,expected,posts,delays",
+    [
+        pytest.param([FakeResponse(503)], True, 2, [1.0], id="retry_5xx"),
+        pytest.param(
+            [FakeResponse(429, {"Retry-After": "0.5"})], True, 2, [0.5], id="retry_after"
+        ),
+        pytest.param(
+            [FakeResponse(429, {"Retry-After": "60"})], False, 1, [], id="retry_after_too_long"
+        ),
+        pytest.param([FakeResponse(400)], False, 1, [], id="no_retry_4xx"),
+        pytest.param([FakeResponse(502)] * 3, False, 3, [1.0, 2.0], id="retries_exhausted"),
+    ],
+)
+async def test_notifier_retry(responses, expected, posts, delays):
+    session = FakeSession(responses=responses)
+    slept = []
+
+    async def fake_sleep(delay):
+        slept.append(delay)
+
+    notifier = DiscordNotifier(
+        webhook_url="https://example.com/webhook", sleep=fake_sleep, session_factory=lambda: session
+    )
+    assert await notifier.send("test", skip_cooldown=True) is expected
+    assert session.post_count == posts
+    # 指数バックオフには最大0.1秒のジッターが乗る
+    assert slept == pytest.approx(delays, abs=0.1)
@@ -0,0 +1,109 @@
+"""
+MockWiSUNClient ユニットテスト
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# serverディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mock_client import MockWiSUNClient
+
+# RSSI(dBm)の下限とrssi_qualityの対応（いずれも満たさなければ"poor"）
+RSSI_QUALITY_THRESHOLDS = [(-60, "excellent"), (-70, "good"), (-80, "fair")]
+
+
+@pytest.fixture(scope="module")
+def mock_client():
+    """接続済みのMockWiSUNClient（モジュール内で共有）"""
+    c = MockWiSUNClient()
+    c.connect()
+    return c
+
+
+def test_mock_client_connect(mock_client):
+    """MockWiSUNClientの接続テスト"""
+    assert mock_client.connect() is True
+
+
+def test_mock_client_get_power_data(mock_client):
+    """MockWiSUNClientのデータ生成テスト"""
+    data = mock_client.get_power_data()
+
+    # 必要なキーが存在する
+    assert "instant_power" in data
+
+    # 値が妥当な範囲
+    assert isinstance(data["instant_power"], int)
+    assert data["instant_power"] > 0
+
+
+def test_mock_client_power_variation(mock_client):
+    """MockWiSUNClientが変動するデータを生成することを確認"""
+    # 10回データを取得して、全て同じ値ではないことを確認
+    powers = [mock_client.get_power_data()["instant_power"] for _ in range(10)]
+    unique_powers = set(powers)
+
+    # ランダムノイズがあるので、10回中少なくとも2つは異なる値になるはず
+    assert len(unique_powers) > 1
+
+
+def test_mock_client_get_connection_info(mock_client):
+    """MockWiSUNClientの接続情報取得テスト"""
+    info = mock_client.get_connection_info()
+
+    # 必要なキーが存在する
+    assert "channel" in info
+    assert "pan_id" in info
+    assert "mac_addr" in info
+    assert "ipv6_addr" in info
+    assert "rssi" in info
+    assert "rssi_quality" in info
+
+    # 値が設定されている
+    assert info["channel"] == "33"
+    assert info["pan_id"] == "MOCK"
+    assert info["mac_addr"] == "MOCK00000001"
+    assert info["ipv6_addr"].startswith("FE80:")
+
+    # RSSIは妥当な範囲 (-80 ~ -50)
+    assert isinstance(info["rssi"], int)
+    assert -80 <= info["rssi"] <= -50
+
+    # rssi_qualityは有効な値
+    assert info["rssi_quality"] in ["excellent", "good", "fair", "poor"]
+
+
+def test_mock_client_connection_info_rssi_quality(mock_client):
+    """RSSIに応じたrssi_qualityの判定テスト"""
+    # 10回取得してrssi_qualityがRSSI値と一致するか確認
+    infos = [mock_client.get_connection_info() for _ in range(10)]
+    expected = [
+        next((q for t, q in RSSI_QUALITY_THRESHOLDS if i["rssi"] >= t), "poor")
+        for i in infos
+    ]
+    assert [i["rssi_quality"] for i in infos] == expected
+
+
+def test_mock_client_get_energy_data(mock_client):
+    """MockWiSUNClientの積算電力量取得テスト"""
+    data = mock_client.get_energy_data()
+
+    # 必要なキーが存在する
+    assert "cumulative_energy" in data
+    assert "cumulative_energy_reverse" in data
+    assert "fixed_energy" in data
+    assert "energy_unit" in data
+
+    # 値が設定されている
+    assert isinstance(data["cumulative_energy"], float)
+    assert data["cumulative_energy"] > 0
+    assert isinstance(data["cumulative_energy_reverse"], float)
+    assert data["energy_unit"] == 0.1
+
+    # fixed_energyの構造確認
+    assert "timestamp" in data["fixed_energy"]
+    assert "energy" in data["fixed_energy"]
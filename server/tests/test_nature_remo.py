@@ -2,17 +2,18 @@
 Nature Remo 連携のユニットテスト
 """
 
+import itertools
+import json
 import sys
 from pathlib import Path
 
 import pytest
-from httpx import AsyncClient, ASGITransport
 
 # serverディレクトリをパスに追加
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import api
-from api import app, set_nature_remo_enabled
+from api import set_nature_remo_enabled
 import nature_remo_controller as nrc
 from nature_remo_controller import NatureRemoController
 
@@ -41,6 +42,7 @@ class FakeSession:
         self.post_status = post_status
         self.get_status = get_status
         self.json_data = json_data or []
+        self.posted_urls = []
 
     async def __aenter__(self):
         return self
@@ -48,60 +50,71 @@ class FakeSession:
     async def __aexit__(self, exc_type, exc, tb):
         return False
 
-    def post(self, *args, **kwargs):
+    def post(self, url, *args, **kwargs):
+        self.posted_urls.append(url)
         return FakeResponse(status=self.post_status)
 
     def get(self, *args, **kwargs):
         return FakeResponse(status=self.get_status, json_data=self.json_data)
 
 
-class FakeTimeout:
-    def __init__(self, total=10):
-        self.total = total
-
-
-@pytest.fixture
-def transport():
-    return ASGITransport(app=app)
-
-
-@pytest.mark.asyncio
-async def test_execute_actions_success(monkeypatch):
-    monkeypatch.setattr(nrc.aiohttp, "ClientSession", lambda *args, **kwargs: FakeSession())
-    monkeypatch.setattr(nrc.aiohttp, "ClientTimeout", FakeTimeout)
-
+ACTIONS = [
+    {
+        "appliance_id": "appliance-1",
+        "endpoint": "light",
+        "params": {"button": "off"},
+    }
+]
+
+
+@pytest.fixture(scope="module")
+def fake_session_factory():
+    return lambda *args, **kwargs: FakeSession(json_data=[{"id": "appliance-1"}])
+
+
+@pytest.mark.parametrize(
+    "post_status,actions,expected,posted_urls",
+    [
+        pytest.param(
+            200, ACTIONS, True,
+            [f"{NatureRemoController.BASE_URL}/appliances/appliance-1/light"],
+            id="success",
+        ),
+        pytest.param(
+            500, ACTIONS, False,
+            [f"{NatureRemoController.BASE_URL}/appliances/appliance-1/light"],
+            id="server_error",
+        ),
+        pytest.param(200, [{"endpoint": "light", "params": {}}], False, [], id="missing_appliance"),
+        pytest.param(
+            200, [{"appliance_id": "appliance-1", "endpoint": "unknown"}], False, [],
+            id="unsupported_endpoint",
+        ),
+    ],
+)
+async def test_execute_actions(post_status, actions, expected, posted_urls):
+    session = FakeSession(post_status=post_status)
     controller = NatureRemoController(
         access_token="token",
         cooldown_minutes=5,
-        actions=[
-            {
-                "appliance_id": "appliance-1",
-                "endpoint": "light",
-                "params": {"button": "off"},
-            }
-        ],
+        actions=actions,
+        session_factory=lambda: session,
     )
 
     ok = await controller.execute_actions(skip_cooldown=True)
-    assert ok is True
+    assert ok is expected
+    assert session.posted_urls == posted_urls
 
 
-@pytest.mark.asyncio
-async def test_execute_actions_cooldown(monkeypatch):
-    monkeypatch.setattr(nrc.aiohttp, "ClientSession", lambda *args, **kwargs: FakeSession())
-    monkeypatch.setattr(nrc.aiohttp, "ClientTimeout", FakeTimeout)
-    monkeypatch.setattr(nrc.time, "time", lambda: 1000)
+async def test_execute_actions_cooldown(monkeypatch, fake_session_factory):
+    # lambdaではなくCレベルの呼び出し可能オブジェクトで固定時刻を返す
+    monkeypatch.setattr(nrc.time, "time", itertools.repeat(1000).__next__)
 
     controller = NatureRemoController(
         access_token="token",
         cooldown_minutes=5,
-        actions=[
-            {
-                "appliance_id": "appliance-1",
-                "endpoint": "light",
-                "params": {"button": "off"},
-            }
-        ],
+        actions=ACTIONS,
+        session_factory=fake_session_factory,
     )
 
     first = await controller.execute_actions(skip_cooldown=False)
@@ -110,34 +123,12 @@ async def test_execute_actions_cooldown(monkeypatch):
     assert second is False
 
 
-@pytest.mark.asyncio
-async def test_get_appliances(monkeypatch):
-    monkeypatch.setattr(
-        nrc.aiohttp,
-        "ClientSession",
-        lambda *args, **kwargs: FakeSession(json_data=[{"id": "appliance-1"}]),
-    )
-    monkeypatch.setattr(nrc.aiohttp, "ClientTimeout", FakeTimeout)
-
-    controller = NatureRemoController(access_token="token")
-    data = await controller.get_appliances()
-    assert data == [{"id": "appliance-1"}]
-
-
-@pytest.mark.asyncio
-async def test_api_nature_remo_not_configured(transport):
-    api.nature_remo_controller = None
-    set_nature_remo_enabled(False)
-
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.post("/api/nature-remo/test")
-
-    assert response.status_code == 200
-    assert response.json()["error"] == "Nature Remo not configured"
+async def test_get_appliances(fake_session_factory):
+    controller = NatureRemoController(access_token="token", session_factory=fake_session_factory)
+    assert await controller.get_appliances() == [{"id": "appliance-1"}]
 
 
-@pytest.mark.asyncio
-async def test_api_nature_remo_test_execute(transport):
+async def test_api_nature_remo_test_execute(client):
     class DummyController:
 
         async def execute_actions(self, skip_cooldown=False):
@@ -146,8 +137,7 @@ async def test_api_nature_remo_test_execute(transport):
     api.nature_remo_controller = DummyController()
     set_nature_remo_enabled(True)
 
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.post("/api/nature-remo/test")
+    response = await client.post("/api/nature-remo/test")
 
     assert response.status_code == 200
-    assert response.json()["success"] is True
+    assert json.loads(response.content)["success"] is True
@@ -0,0 +1,334 @@
+"""
+Wi-SUNクライアント（ECHONET Liteパース部）のユニットテスト
+"""
+
+import io
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# serverディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import wisun_client
+from wisun_client import ScanResult, WiSUNClient
+
+
+# Get_Res（ESV=72）のヘッダ: EHD + TID + SEOJ(028801) + DEOJ(05FF01) + ESV
+GET_RES_HEADER = "1081" + "0001" + "028801" + "05FF01" + "72"
+
+
+class FakeSerial:
+    """受信データを事前に積んでおくシリアルポートの代替
+
+    replyは最初の書き込み後に受信される（送信前の読み捨ての対象にならない）
+    """
+
+    def __init__(self, rx: bytes = b"", reply: bytes = b""):
+        self._rx = io.BytesIO(rx)
+        self._reply = reply
+        self.written = []
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    @property
+    def in_waiting(self):
+        return len(self._rx.getbuffer()) - self._rx.tell()
+
+    def read(self, size=1):
+        return self._rx.read(size)
+
+    def write(self, data):
+        self.written.append(data)
+        if self._reply:
+            pos = self._rx.tell()
+            self._rx.seek(0, io.SEEK_END)
+            self._rx.write(self._reply)
+            self._rx.seek(pos)
+            self._reply = b""
+        return len(data)
+
+
+def erxudp(data: str) -> bytes:
+    """SA2=1形式のERXUDP行"""
+    return (
+        f"ERXUDP FE80:0000:0000:0000:021D:1290:1234:5678 FE80:0000:0000:0000:021D:1291:0000:0574"
+        f" 0E1A 0E1A 001D129012345678 3C 1 0 {len(data) // 2:04X} {data}\r\n"
+    ).encode()
+
+
+@pytest.fixture
+def wisun():
+    return WiSUNClient(port="/dev/null", broute_id="id", broute_pwd="pwd")
+
+
+@pytest.mark.parametrize(
+    "data,expected",
+    [
+        pytest.param(GET_RES_HEADER + "01" + "E704000003E8", {"E7": b"\x00\x00\x03\xe8"}, id="single"),
+        pytest.param(
+            GET_RES_HEADER + "02" + "E10101" + "E704FFFFFF9C",
+            {"E1": b"\x01", "E7": b"\xff\xff\xff\x9c"},
+            id="multiple",
+        ),
+        pytest.param("1082" + GET_RES_HEADER[4:] + "01" + "E704000003E8", None, id="not_echonet_lite"),
+        pytest.param(GET_RES_HEADER[:-2] + "62" + "01" + "E70400000000", None, id="not_response"),
+        pytest.param(GET_RES_HEADER, None, id="too_short"),
+        pytest.param(GET_RES_HEADER + "02" + "E704000003E8", None, id="truncated_property"),
+        pytest.param(GET_RES_HEADER + "01" + "E7040000", None, id="truncated_edt"),
+        pytest.param(GET_RES_HEADER + "01" + "E7XX", None, id="invalid_hex"),
+    ],
+)
+def test_parse_echonet_response(wisun, data, expected):
+    assert wisun._parse_echonet_response(data) == expected
+
+
+def test_parse_echonet_response_filters_epcs(wisun):
+    """要求したEPCのみ取り出す"""
+    data = GET_RES_HEADER + "02" + "E10101" + "E704FFFFFF9C"
+    assert wisun._parse_echonet_response(data, ["E7"]) == {"E7": b"\xff\xff\xff\x9c"}
+
+
+def test_build_echonet_frame_multiple_epcs(wisun):
+    """複数EPCを指定するとOPCが増え、各プロパティはPDC=0で並ぶ"""
+    frame = wisun._build_echonet_frame(["E0", "E3"])
+    assert frame == bytes.fromhex("1081" + "0001" + "05FF01" + "028801" + "62" + "02" + "E000" + "E300")
+
+
+def test_get_energy_data_single_request(wisun, monkeypatch):
+    """積算電力量データは1回の要求でまとめて取得する"""
+    requests = []
+
+    def fake_send_multi(epcs):
+        requests.append(epcs)
+        return {
+            "E1": b"\x01",
+            "E0": (12345).to_bytes(4, "big"),
+            "E3": (100).to_bytes(4, "big"),
+            "EA": bytes.fromhex("07E80102031E00" + "00003039"),
+        }
+
+    monkeypatch.setattr(wisun, "_send_echonet_multi", fake_send_multi)
+
+    data = wisun.get_energy_data()
+
+    assert requests == [["E1", "E0", "E3", "EA"]]
+    assert data["energy_unit"] == 0.1
+    assert data["cumulative_energy"] == pytest.approx(1234.5)
+    assert data["cumulative_energy_reverse"] == pytest.approx(10.0)
+    assert data["fixed_energy"]["timestamp"] == "2024-01-02 03:30:00"
+
+
+def test_get_instant_power_negative(wisun, monkeypatch):
+    """瞬時電力は符号付き32ビット整数（売電時は負）"""
+    monkeypatch.setattr(wisun, "_send_echonet", lambda epc: b"\xff\xff\xff\x9c")
+    assert wisun.get_instant_power() == -100
+
+
+def test_get_fixed_cumulative_energy(wisun, monkeypatch):
+    """定時積算電力量は日時と積算値（単位換算済み）"""
+    wisun.energy_unit = 0.1
+    # 2024-01-02 03:30:00, 12345
+    edt = bytes.fromhex("07E8" + "01" + "02" + "03" + "1E" + "00" + "00003039")
+    monkeypatch.setattr(wisun, "_send_echonet", lambda epc: edt)
+
+    fixed = wisun.get_fixed_cumulative_energy()
+
+    assert fixed["timestamp"] == "2024-01-02 03:30:00"
+    assert fixed["energy"] == pytest.approx(1234.5)
+
+
+def test_reconnect_backoff_grows_exponentially(wisun, monkeypatch):
+    """再接続の失敗が続くとバックオフが指数的に伸び、成功でリセットされる"""
+    monkeypatch.setattr(wisun_client.random, "randint", lambda a, b: 0)
+    monkeypatch.setattr(wisun, "_adapter_alive", lambda: True)
+    monkeypatch.setattr(wisun, "reconnect", lambda: False)
+    wisun._needs_reconnect = True
+
+    backoffs = []
+    for _ in range(3):
+        wisun.get_power_data()
+        backoffs.append(wisun._reconnect_backoff)
+        # バックオフ分のポーリングを消化
+        while wisun._reconnect_backoff > 0:
+            wisun.get_power_data()
+    assert backoffs == [1, 2, 4]
+
+    monkeypatch.setattr(wisun, "reconnect", lambda: True)
+    monkeypatch.setattr(wisun, "get_instant_power", lambda: 500)
+    assert wisun.get_power_data() == {"instant_power": 500}
+    assert wisun._reconnect_attempt == 0
+
+
+def test_energy_unit_persisted_in_cache(tmp_path, monkeypatch):
+    """積算電力量単位はキャッシュに保存され、次回起動時は取得を省略する"""
+    cache_file = str(tmp_path / "wisun_cache.json")
+    first = WiSUNClient(port="/dev/null", broute_id="id", broute_pwd="pwd", cache_file=cache_file)
+    first.scan_result = ScanResult(channel="21", pan_id="1234", addr="001D129012345678")
+    first.ipv6_addr = "FE80:0000:0000:0000:021D:1290:1234:5678"
+    monkeypatch.setattr(first, "_send_echonet", lambda epc: b"\x02")
+    assert first._get_energy_unit() == 0.01
+    assert not (tmp_path / "wisun_cache.json.tmp").exists()
+
+    second = WiSUNClient(port="/dev/null", broute_id="id", broute_pwd="pwd", cache_file=cache_file)
+    assert second._load_cache()
+    monkeypatch.setattr(second, "_send_echonet", lambda epc: pytest.fail("unexpected request"))
+    assert second._get_energy_unit() == 0.01
+
+
+def test_send_echonet_ignores_stale_tid(wisun):
+    """前回要求への遅延応答（TID不一致）は読み捨て、今回のTIDの応答を返す"""
+    stale = "1081" + "0001" + "028801" + "05FF01" + "72" + "01" + "E704000003E7"
+    fresh = "1081" + "0002" + "028801" + "05FF01" + "72" + "01" + "E704000003E8"
+    wisun.ser = FakeSerial(reply=erxudp(stale) + erxudp(fresh))
+    wisun.ipv6_addr = "FE80:0000:0000:0000:021D:1290:1234:5678"
+    wisun._tid = 1
+
+    assert wisun.get_instant_power() == 1000
+    # 送信フレームのTIDは連番
+    assert wisun.ser.written[0].endswith(bytes.fromhex("10810002" + "05FF01" + "028801" + "6201E700"))
+
+
+def test_readline_with_deadline_splits_bulk_read(wisun):
+    """まとめて読んだデータを行単位で返し、未完の行は次の受信まで保持する"""
+    wisun.ser = FakeSerial(b"EVENT 21 FE80:1 0 00\r\nOK\r\nERXU")
+
+    assert wisun._readline_with_deadline(time.monotonic() + 1) == b"EVENT 21 FE80:1 0 00"
+    assert wisun._readline_with_deadline(time.monotonic() + 1) == b"OK"
+    assert wisun._readline_with_deadline(time.monotonic()) is None
+    assert wisun._rx_buf == b"ERXU"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="デバイスファイルの存在確認はPOSIXのみ")
+def test_power_data_detects_unplugged_device(tmp_path, monkeypatch):
+    """シリアルデバイスが消えたら送信せずに再接続待ちにする"""
+    wisun = WiSUNClient(port=str(tmp_path / "ttyUSB0"), broute_id="id", broute_pwd="pwd")
+    monkeypatch.setattr(wisun, "get_instant_power", lambda: pytest.fail("unexpected request"))
+
+    assert wisun.get_power_data() == {"instant_power": None}
+    assert wisun._needs_reconnect is True
+    assert wisun._port_lost is True
+
+
+def test_send_echonet_write_error_triggers_reconnect(wisun):
+    """書き込み時のSerialException（抜去など）は即座に再接続を要求する"""
+
+    class BrokenSerial(FakeSerial):
+        def write(self, data):
+            raise wisun_client.serial.SerialException("device disconnected")
+
+    wisun.ser = BrokenSerial()
+    wisun.ipv6_addr = "FE80:0000:0000:0000:021D:1290:1234:5678"
+
+    assert wisun._send_echonet("E7") is None
+    assert wisun._needs_reconnect is True
+
+
+def test_send_command_stops_on_fail(wisun):
+    """FAIL応答を受けたら待ち文字列を待たずに戻る"""
+    wisun.ser = FakeSerial(reply=b"SKSETPWD C pwd\r\nFAIL ER04\r\n")
+
+    assert wisun._send_command("SKSETPWD C pwd", "OK", timeout=5) == ["SKSETPWD C pwd", "FAIL ER04"]
+
+
+def test_send_echonet_drains_stale_input(wisun):
+    """送信前に溜まっていた行は読み捨て、その中のEVENT 29は再接続要求にする"""
+    fresh = "1081" + "0001" + "028801" + "05FF01" + "72" + "01" + "E704000003E8"
+    wisun.ipv6_addr = "FE80:0000:0000:0000:021D:1290:1234:5678"
+
+    wisun.ser = FakeSerial(b"EVENT 21 FE80:1 0 01\r\n", reply=erxudp(fresh))
+    assert wisun._send_echonet("E7") == b"\x00\x00\x03\xe8"
+
+    wisun.ser = FakeSerial(b"EVENT 29 FE80:1\r\n", reply=erxudp(fresh))
+    assert wisun._send_echonet("E7") is None
+    assert wisun._needs_reconnect is True
+    assert wisun.ser.written == []
+
+
+@pytest.mark.parametrize(
+    "lines,expected",
+    [
+        pytest.param(
+            ["OK", "EVENT 20 FE80:1", "EPANDESC", "Channel:21", "Channel Page:09", "Pan ID:8888",
+             "Addr:001D129012345678", "LQI:5A", "PairID:00000001", "EVENT 22 FE80:1"],
+            ScanResult(channel="21", pan_id="8888", addr="001D129012345678"),
+            id="found",
+        ),
+        pytest.param(["OK", "EVENT 22 FE80:1"], None, id="not_found"),
+    ],
+)
+def test_scan_parses_epandesc(wisun, monkeypatch, lines, expected):
+    monkeypatch.setattr(wisun, "_send_command", lambda *args, **kwargs: lines)
+    assert wisun._scan() == expected
+
+
+def test_load_cache_keeps_in_memory_state(tmp_path):
+    """接続情報を保持していればキャッシュファイルを読まない"""
+    cache_file = tmp_path / "wisun_cache.json"
+    cache_file.write_text('{"channel": "33", "pan_id": "FFFF", "addr": "0000000000000000"}')
+    wisun = WiSUNClient(port="/dev/null", broute_id="id", broute_pwd="pwd", cache_file=str(cache_file))
+    wisun.scan_result = ScanResult(channel="21", pan_id="1234", addr="001D129012345678")
+
+    assert wisun._load_cache()
+    assert wisun.scan_result.channel == "21"
+
+
+def test_response_timeout_follows_rtt(wisun):
+    """応答待ちタイムアウトは直近RTTの4倍（2〜5秒に制限）、未計測なら5秒"""
+    assert wisun._response_timeout() == 5.0
+
+    wisun._record_rtt(0.3)
+    assert wisun._response_timeout() == 2.0
+
+    wisun._record_rtt(0.3 + 4 * 0.5)  # 平滑値 0.3 + 0.25 * 2.0 = 0.8
+    assert wisun._response_timeout() == pytest.approx(3.2)
+
+    wisun._record_rtt(10.0)
+    assert wisun._response_timeout() == 5.0
+
+
+def test_reopen_failure_recovers_on_next_reconnect(wisun, monkeypatch):
+    """アダプタ再オープンに失敗しても、次の再接続でポートを開き直して復帰する"""
+    monkeypatch.setattr(wisun_client.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(wisun_client.random, "randint", lambda a, b: 0)
+    monkeypatch.setattr(wisun, "_adapter_alive", lambda: False)
+    monkeypatch.setattr(wisun, "reconnect", lambda: False)
+
+    def serial_unavailable(*args, **kwargs):
+        raise wisun_client.serial.SerialException("device re-enumerating")
+
+    monkeypatch.setattr(wisun_client.serial, "Serial", serial_unavailable)
+    wisun.ser = FakeSerial()
+    wisun._needs_reconnect = True
+
+    # 再オープン失敗: 例外を出さず、閉じたポートも残さない
+    assert wisun.get_power_data() == {"instant_power": None}
+    assert wisun.ser is None
+
+    # デバイスが戻った後の再接続でポートを開き直す
+    reopened = FakeSerial()
+    monkeypatch.setattr(wisun_client.serial, "Serial", lambda *args, **kwargs: reopened)
+    monkeypatch.setattr(wisun, "_send_command", lambda cmd, *args, **kwargs: ["OK", "EVENT 25"])
+    wisun.ipv6_addr = "FE80:0000:0000:0000:021D:1290:1234:5678"
+
+    assert WiSUNClient.reconnect(wisun) is True
+    assert wisun.ser is reopened
+    assert reopened.written[:2] == [b"SKTERM\r\n", b"SKRESET\r\n"]
+
+
+@pytest.mark.parametrize("error", [NotImplementedError, ValueError, AttributeError])
+def test_open_ignores_unsupported_low_latency(wisun, monkeypatch, error):
+    """低遅延モード非対応（Linux以外・非対応デバイス）でもポートは開ける"""
+
+    class NoLowLatencySerial(FakeSerial):
+        def set_low_latency_mode(self, enabled):
+            raise error("low latency not supported")
+
+    monkeypatch.setattr(wisun_client.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(wisun_client.serial, "Serial", lambda *args, **kwargs: NoLowLatencySerial())
+
+    assert wisun.open() is True
@@ -6,10 +6,14 @@ SKコマンドでスマートメーターと通信し、ECHONET Liteで電力値
 """
 
 import logging
+import random
+import select
 import serial
+import struct
 import time
 import json
 import os
+import re
 from typing import Optional
 from dataclasses import dataclass
 
@@ -26,10 +30,17 @@ class WiSUNClient:
     """Wi-SUN Bルート通信クライアント"""
 
     # ECHONET Lite定数
-    ECHONET_LITE_HEADER = "1081"  # EHD
-    ECHONET_LITE_TID = "0001"    # トランザクションID
-    SEOJ = "05FF01"              # 送信元（コントローラー）
-    DEOJ = "028801"              # 宛先（低圧スマート電力量メーター）
+    ECHONET_LITE_HEADER = 0x1081  # EHD
+    ECHONET_LITE_TID = 0x0001    # トランザクションID（送信時は連番に差し替え）
+    SEOJ = b"\x05\xff\x01"        # 送信元（コントローラー）
+    DEOJ = b"\x02\x88\x01"        # 宛先（低圧スマート電力量メーター）
+    ESV_GET = 0x62
+    ESV_SETC = 0x61
+
+    # ECHONET Liteフレームの固定部（EHD, TID, SEOJ, DEOJ, ESV, OPC）
+    _FRAME_HEADER = struct.Struct(">HH3s3sBB")
+    # EPC値 -> 16進大文字のキー（応答パース時に毎回formatしない）
+    _EPC_KEYS = tuple(format(i, '02X') for i in range(256))
 
     # EPC（ECHONET Liteプロパティコード）
     EPC_INSTANT_POWER = "E7"     # 瞬時電力計測値
@@ -38,6 +49,33 @@ class WiSUNClient:
     EPC_CUMULATIVE_ENERGY_UNIT = "E1" # 積算電力量単位
     EPC_CUMULATIVE_ENERGY_FIXED = "EA" # 定時積算電力量（正方向）
 
+    # 積算電力量単位（E1）のコード -> kWh
+    _UNIT_MAP = {
+        0x00: 1.0,
+        0x01: 0.1,
+        0x02: 0.01,
+        0x03: 0.001,
+        0x04: 0.0001,
+        0x0A: 10.0,
+        0x0B: 100.0,
+        0x0C: 1000.0,
+        0x0D: 10000.0,
+    }
+
+    # _send_echonet で処理する応答行（行頭を1回の照合で判別）
+    _RESPONSE_LINE_RE = re.compile(rb"(?P<ev29>EVENT 29)|(?P<ev21>EVENT 21)|(?P<erxudp>ERXUDP)")
+
+    # SKSCAN結果（EPANDESC）のChannel, Pan ID, Addr, LQIを一度に取り出す
+    _SCAN_RE = re.compile(
+        r"Channel:\s*(\S+).*?Pan ID:\s*(\S+).*?Addr:\s*(\S+)(?:\s*LQI:\s*(\S+))?",
+        re.DOTALL,
+    )
+
+    # ECHONET Lite応答待ちタイムアウト（秒）: 直近RTTの平滑値の4倍を下限/上限で制限
+    RESPONSE_TIMEOUT_MIN = 2.0
+    RESPONSE_TIMEOUT_MAX = 5.0
+    RTT_EWMA_ALPHA = 0.25
+
     def __init__(self, port: str, broute_id: str, broute_pwd: str,
                  baud_rate: int = 115200, cache_file: Optional[str] = None):
         """
@@ -65,6 +103,13 @@ class WiSUNClient:
         self.max_timeouts_before_reconnect: int = 2  # 再接続までの許容回数
         self._needs_reconnect: bool = False  # 即座に再接続が必要かどうか
         self._reconnect_backoff: int = 0  # 再接続失敗後のバックオフ（ポーリング回数）
+        self._reconnect_attempt: int = 0  # 連続した再接続失敗回数（バックオフ計算用）
+        self._port_lost: bool = False  # USBアダプタの抜去を検知してポートを閉じたかどうか
+        self._tid: int = 0  # 直近に送信したECHONET LiteトランザクションID
+        self._send_cache: dict[str, tuple[bytes, bytes]] = {}  # EPCの組 -> 送信バイト列（TIDの前, 後）
+        self._send_cache_addr: Optional[str] = None  # キャッシュ作成時のIPv6アドレス
+        self._rx_buf = bytearray()  # 受信済みで未処理のバイト列（行単位で切り出す）
+        self._rtt_ewma: Optional[float] = None  # ECHONET Lite応答時間の指数移動平均（秒、未計測ならNone）
 
     def open(self) -> bool:
         """シリアルポートを開く"""
@@ -74,26 +119,88 @@ class WiSUNClient:
                 self.baud_rate,
                 timeout=2
             )
+            self._rx_buf.clear()
+            self._set_low_latency()
             time.sleep(0.5)
             return True
         except serial.SerialException as e:
             logging.error(f"Serial open error: {e}")
+            # 閉じたポートを残さない（次の再接続で開き直す）
+            self.ser = None
             return False
 
+    def _set_low_latency(self):
+        """
+        USBシリアルの低遅延モード（ASYNC_LOW_LATENCY）を有効化
+
+        FTDI等はデフォルトで受信データを最大16msバッファリングするため、
+        応答1行ごとの遅延を減らす。Linux以外や非対応デバイスでは何もしない
+        """
+        try:
+            self.ser.set_low_latency_mode(True)
+            logging.debug("Serial low latency mode enabled")
+        except (AttributeError, ValueError, NotImplementedError) as e:
+            # NotImplementedError: macOS/BSDなどLinux以外のPOSIX
+            logging.debug(f"Serial low latency mode not available: {e}")
+
     def close(self):
         """シリアルポートを閉じる"""
         if self.ser and self.ser.is_open:
             self.ser.close()
 
+    def _readline_with_deadline(self, deadline: float) -> Optional[bytes]:
+        """
+        期限まで1行の受信を待つ
+
+        POSIXではselectでデータ到着までカーネル内で待機し、
+        固定間隔ポーリング（sleep）による受信遅延を避ける。
+        到着済みのデータはまとめて1回のreadで受信バッファに取り込み、
+        行の切り出しはバッファ上で行う（readline()は1バイトずつ読むため）
+
+        Args:
+            deadline: 期限（time.monotonic()基準）
+
+        Returns:
+            受信した行のバイト列（前後の空白を除去）。期限切れの場合はNone
+        """
+        while True:
+            end = self._rx_buf.find(b"\n")
+            if end >= 0:
+                line = bytes(self._rx_buf[:end]).strip()
+                del self._rx_buf[:end + 1]
+                return line
+            waiting = self.ser.in_waiting
+            if waiting > 0:
+                self._rx_buf += self.ser.read(waiting)
+                continue
+            # 時刻は待機に入るときだけ参照し、残り時間をselectのタイムアウトに渡す
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if os.name == "posix":
+                select.select([self.ser.fileno()], [], [], remaining)
+            else:
+                time.sleep(min(remaining, 0.01))
+
+    def _discard_input(self) -> bytes:
+        """受信バッファ（シリアル側・未処理分とも）を読み捨て、破棄したバイト列を返す"""
+        discarded = bytes(self._rx_buf)
+        self._rx_buf.clear()
+        while self.ser and self.ser.in_waiting > 0:
+            discarded += self.ser.read(self.ser.in_waiting)
+        return discarded
+
     def _send_command(self, cmd: str, wait_for: Optional[str] = None,
-                      timeout: float = 10.0) -> list[str]:
+                      timeout: float = 10.0, drain_first: bool = True) -> list[str]:
         """
         SKコマンドを送信して応答を受信
 
         Args:
             cmd: 送信するコマンド
-            wait_for: この文字列を含む行が来るまで待つ
+            wait_for: この文字列を含む行が来るまで待つ（FAIL応答が来た場合もそこで終了）
             timeout: タイムアウト秒数
+            drain_first: 送信前に未処理の受信データを捨てる
+                （前の要求の遅れた応答やイベントを今回の応答と取り違えないため）
 
         Returns:
             受信した行のリスト
@@ -101,30 +208,41 @@ class WiSUNClient:
         if not self.ser:
             return []
 
+        if drain_first:
+            self._discard_input()
+
         # 送信
         self.ser.write((cmd + "\r\n").encode())
 
         # 受信
         lines = []
-        start_time = time.time()
+        deadline = time.monotonic() + timeout
 
         while True:
-            if time.time() - start_time > timeout:
+            raw = self._readline_with_deadline(deadline)
+            if raw is None:
                 break
-
-            if self.ser.in_waiting > 0:
-                line = self.ser.readline().decode('utf-8', errors='ignore').strip()
-                if line:
-                    lines.append(line)
-                    if wait_for and wait_for in line:
-                        break
-            else:
-                time.sleep(0.1)
+            line = raw.decode('utf-8', errors='ignore')
+            if line:
+                lines.append(line)
+                if wait_for and wait_for in line:
+                    break
+                # エラー応答（FAIL ERxx）の後に待ち文字列は来ないのでタイムアウトを待たない
+                if line.startswith("FAIL"):
+                    logging.warning(f"{cmd.split(' ', 1)[0]} failed: {line}")
+                    break
 
         return lines
 
     def _load_cache(self) -> bool:
-        """キャッシュから接続情報を読み込む"""
+        """
+        キャッシュから接続情報を読み込む
+
+        同じプロセス内で接続済みの情報を持っていれば、ファイルは読まずにそれを使う
+        """
+        if self.scan_result is not None:
+            return True
+
         if not os.path.exists(self.cache_file):
             return False
 
@@ -137,6 +255,9 @@ class WiSUNClient:
                     addr=data['addr']
                 )
                 self.ipv6_addr = data.get('ipv6_addr')
+                # 積算電力量単位はメーター固有で変わらないので、あれば取得を省略する
+                if self.energy_unit is None:
+                    self.energy_unit = data.get('energy_unit')
                 return True
         except Exception as e:
             logging.warning(f"Cache load error: {e}")
@@ -152,10 +273,17 @@ class WiSUNClient:
                 'channel': self.scan_result.channel,
                 'pan_id': self.scan_result.pan_id,
                 'addr': self.scan_result.addr,
-                'ipv6_addr': self.ipv6_addr
+                'ipv6_addr': self.ipv6_addr,
+                'energy_unit': self.energy_unit
             }
-            with open(self.cache_file, 'w') as f:
+            # 書き込み途中の電源断で壊れたキャッシュが残ると次回起動時に
+            # 再スキャン（約2分）になるため、一時ファイルに書いてから置き換える
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, 'w') as f:
                 json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.cache_file)
         except Exception as e:
             logging.warning(f"Cache save error: {e}")
 
@@ -229,7 +357,8 @@ class WiSUNClient:
 
         # PANA接続
         logging.info("Connecting (SKJOIN)...")
-        result = self._send_command(f"SKJOIN {self.ipv6_addr}", "EVENT 25", timeout=30)
+        result = self._send_command(f"SKJOIN {self.ipv6_addr}", "EVENT 25", timeout=30,
+                                    drain_first=False)
 
         # 接続成功確認
         for line in result:
@@ -237,16 +366,17 @@ class WiSUNClient:
                 logging.info("Connected successfully!")
                 # 接続後バッファクリア
                 time.sleep(0.5)
-                while self.ser and self.ser.in_waiting > 0:
-                    self.ser.read(self.ser.in_waiting)
+                self._discard_input()
                 # PANAセッション情報をログ
                 self._log_pana_session_info()
                 return True
             if "EVENT 24" in line:
                 logging.error("Connection failed (EVENT 24)")
-                # キャッシュ削除
+                # キャッシュ削除（メモリ上の接続情報も破棄して次回は再スキャン）
                 if os.path.exists(self.cache_file):
                     os.remove(self.cache_file)
+                self.scan_result = None
+                self.ipv6_addr = None
                 return False
 
         logging.error("Connection timeout")
@@ -261,6 +391,12 @@ class WiSUNClient:
         """
         logging.warning("Attempting reconnection...")
 
+        # アダプタ再オープンに失敗した後などでポートが閉じていれば開き直す
+        if not (self.ser and self.ser.is_open):
+            logging.info("Serial port is not open, reopening...")
+            if not self.open():
+                return False
+
         # まず SKTERM で明示的に切断を試行
         if self.ser and self.ser.is_open:
             try:
@@ -272,8 +408,7 @@ class WiSUNClient:
                 self.ser.write(b"SKRESET\r\n")
                 time.sleep(1)
                 # バッファクリア
-                while self.ser.in_waiting > 0:
-                    self.ser.read(self.ser.in_waiting)
+                self._discard_input()
                 # SKRESET後に認証情報・レジスタを再設定
                 logging.info("Re-setting B-route credentials...")
                 self._send_command(f"SKSETRBID {self.broute_id}", "OK")
@@ -288,7 +423,8 @@ class WiSUNClient:
         # 再接続（SKJOINのみ、スキャン不要）
         if self.ipv6_addr:
             logging.info("Reconnecting (SKJOIN)...")
-            result = self._send_command(f"SKJOIN {self.ipv6_addr}", "EVENT 25", timeout=30)
+            result = self._send_command(f"SKJOIN {self.ipv6_addr}", "EVENT 25", timeout=30,
+                                        drain_first=False)
 
             for line in result:
                 if "EVENT 25" in line:
@@ -296,8 +432,7 @@ class WiSUNClient:
                     self.consecutive_timeouts = 0
                     # PANAセッション安定待ち＆バッファクリア
                     time.sleep(2)
-                    while self.ser and self.ser.in_waiting > 0:
-                        self.ser.read(self.ser.in_waiting)
+                    self._discard_input()
                     # PANAセッション情報をログ
                     self._log_pana_session_info()
                     return True
@@ -311,6 +446,15 @@ class WiSUNClient:
             logging.error("No IPv6 address for reconnection")
             return False
 
+    def _adapter_alive(self) -> bool:
+        """SKVERでアダプタ自体が応答するか確認（ハートビート）"""
+        try:
+            lines = self._send_command("SKVER", "OK", timeout=5)
+        except Exception as e:
+            logging.warning(f"SKVER heartbeat error: {e}")
+            return False
+        return any(line.startswith("EVER") for line in lines)
+
     def _log_pana_session_info(self):
         """PANA接続後にセッション関連レジスタをログ出力"""
         try:
@@ -340,29 +484,15 @@ class WiSUNClient:
         # テセラ製ドングルは最後のパラメータ(0)が必要
         lines = self._send_command("SKSCAN 2 FFFFFFFF 7 0", "EVENT 22", timeout=120)
 
-        # 結果パース
-        channel = None
-        pan_id = None
-        addr = None
-        lqi = None
-
-        for line in lines:
-            stripped = line.strip()
-            if stripped.startswith("Channel:"):
-                channel = stripped.split(":")[1].strip()
-            elif stripped.startswith("Pan ID:"):
-                pan_id = stripped.split(":")[1].strip()
-            elif stripped.startswith("Addr:"):
-                addr = stripped.split(":")[1].strip()
-            elif stripped.startswith("LQI:"):
-                lqi = stripped.split(":")[1].strip()
-
-        if channel and pan_id and addr:
-            if lqi:
-                logging.info(f"Scan LQI: {lqi} (signal quality)")
-            return ScanResult(channel=channel, pan_id=pan_id, addr=addr)
+        # 結果パース（受信全体に1回の正規表現検索。複数見つかった場合は最後のもの）
+        found = self._SCAN_RE.findall("\n".join(lines))
+        if not found:
+            return None
 
-        return None
+        channel, pan_id, addr, lqi = found[-1]
+        if lqi:
+            logging.info(f"Scan LQI: {lqi} (signal quality)")
+        return ScanResult(channel=channel, pan_id=pan_id, addr=addr)
 
     def _get_ipv6_addr(self, mac_addr: str) -> Optional[str]:
         """MACアドレスからIPv6リンクローカルアドレスを取得"""
@@ -374,125 +504,213 @@ class WiSUNClient:
 
         return None
 
-    def _build_echonet_frame(self, epc: str, edt: str = "") -> str:
-        """ECHONET Liteフレームを構築"""
-        esv = "62" if edt == "" else "61"  # Get or SetC
-        opc = "01"  # 処理プロパティ数
-        pdc = format(len(edt) // 2, '02X')  # EDTバイト数
-
-        frame = (
-            self.ECHONET_LITE_HEADER +
-            self.ECHONET_LITE_TID +
-            self.SEOJ +
-            self.DEOJ +
-            esv +
-            opc +
-            epc +
-            pdc +
-            edt
+    def _build_echonet_frame(self, epc: str | list[str], edt: bytes = b"",
+                             tid: int = ECHONET_LITE_TID) -> bytes:
+        """
+        ECHONET Liteフレームを構築
+
+        epcにリストを渡すと、複数プロパティを1電文で要求するフレームになる
+        """
+        epcs = [epc] if isinstance(epc, str) else epc
+        esv = self.ESV_GET if not edt else self.ESV_SETC
+
+        header = self._FRAME_HEADER.pack(
+            self.ECHONET_LITE_HEADER, tid, self.SEOJ, self.DEOJ, esv, len(epcs)
         )
+        # 各プロパティ: EPC + PDC（EDTバイト数） + EDT
+        props = b"".join(bytes((int(e, 16), len(edt))) + edt for e in epcs)
+        return header + props
+
+    def _next_tid(self) -> int:
+        """次のトランザクションIDを払い出す（16ビットで循環）"""
+        self._tid = (self._tid + 1) & 0xFFFF
+        return self._tid
+
+    def _get_send_bytes(self, epcs: list[str], tid: int) -> bytes:
+        """
+        EPCの組に対応するSKSENDTOコマンド+ECHONET Liteフレームを取得
 
-        return frame
+        宛先・フレームはセッション中変わらないためEPCの組ごとにキャッシュし、
+        IPv6アドレスが変わったら作り直す。TIDのみ送信ごとに差し替える
+        """
+        if self._send_cache_addr != self.ipv6_addr:
+            self._send_cache.clear()
+            self._send_cache_addr = self.ipv6_addr
+
+        key = "".join(epcs)
+        cached = self._send_cache.get(key)
+        if cached is None:
+            frame_bytes = self._build_echonet_frame(epcs)
+            # 注意: テセラ製Wi-SUNモジュールでは、コマンドとデータを一度に送信
+            # データの後にCRLFを付けない
+            cmd = f"SKSENDTO 1 {self.ipv6_addr} 0E1A 1 0 {len(frame_bytes):04X} "
+            # TID（EHDの直後2バイト）の前後に分けて保持
+            cached = (cmd.encode() + frame_bytes[:2], frame_bytes[4:])
+            self._send_cache[key] = cached
+        head, tail = cached
+        return head + tid.to_bytes(2, "big") + tail
+
+    def _response_timeout(self) -> float:
+        """直近の応答時間から応答待ちタイムアウトを決める（未計測なら上限値）"""
+        if self._rtt_ewma is None:
+            return self.RESPONSE_TIMEOUT_MAX
+        return min(self.RESPONSE_TIMEOUT_MAX, max(self.RESPONSE_TIMEOUT_MIN, 4 * self._rtt_ewma))
+
+    def _record_rtt(self, rtt: float):
+        """応答時間を指数移動平均に反映"""
+        if self._rtt_ewma is None:
+            self._rtt_ewma = rtt
+        else:
+            self._rtt_ewma += self.RTT_EWMA_ALPHA * (rtt - self._rtt_ewma)
 
-    def _send_echonet(self, epc: str, _retry_count: int = 0) -> Optional[str]:
+    def _send_echonet(self, epc: str) -> Optional[bytes]:
         """ECHONET Lite電文を送信してEDTを取得"""
+        props = self._send_echonet_multi([epc])
+        return props.get(epc) if props else None
+
+    def _send_echonet_multi(self, epcs: list[str],
+                            _retry_count: int = 0) -> Optional[dict[str, bytes]]:
+        """
+        複数プロパティを1電文でGetしてEDTを取得
+
+        Args:
+            epcs: 取得するEPCのリスト
+
+        Returns:
+            {EPC: EDTのバイト列}。取得失敗時はNone
+        """
         MAX_SEND_RETRIES = 3
+        epc = ",".join(epcs)  # ログ表示用
+        # 受信行ごとのデバッグログは整形コストがかかるので、無効時は組み立てない
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
 
         if not self.ser or not self.ipv6_addr:
             logging.debug(f"_send_echonet: ser={self.ser is not None}, ipv6={self.ipv6_addr}")
             return None
 
-        frame = self._build_echonet_frame(epc)
-        frame_bytes = bytes.fromhex(frame)
+        # 前回の要求以降に届いた未処理の行を捨てる（EVENT 29だけは取りこぼさない）
+        stale = self._discard_input()
+        if b"EVENT 29" in stale:
+            logging.error("PANA session disconnected (EVENT 29), triggering reconnect")
+            self._needs_reconnect = True
+            return None
 
-        # SKSENDTO送信
-        # 注意: テセラ製Wi-SUNモジュールでは、コマンドとデータを一度に送信
-        # データの後にCRLFを付けない
-        cmd = f"SKSENDTO 1 {self.ipv6_addr} 0E1A 1 0 {len(frame_bytes):04X} "
-        logging.debug(f"_send_echonet: sending cmd for EPC={epc}" + (f" (retry {_retry_count})" if _retry_count else ""))
+        # SKSENDTO送信（応答はTIDで対応付ける）
+        tid = self._next_tid()
+        tid_hex = b"%04X" % tid
+        send_bytes = self._get_send_bytes(epcs, tid)
+        if debug:
+            logging.debug(f"_send_echonet: sending cmd for EPC={epc}" + (f" (retry {_retry_count})" if _retry_count else ""))
         try:
-            self.ser.write(cmd.encode() + frame_bytes)
+            self.ser.write(send_bytes)
+        except serial.SerialException as e:
+            # デバイス抜去などポート自体の異常はタイムアウトを待たずに再接続へ
+            logging.error(f"_send_echonet: serial write error: {e}")
+            self._needs_reconnect = True
+            return None
         except Exception as e:
             logging.error(f"_send_echonet: write error: {e}")
             return None
 
-        # 応答待ち（5秒タイムアウト）
-        start_time = time.time()
-        while time.time() - start_time < 5:
-            if self.ser.in_waiting > 0:
-                try:
-                    line = self.ser.readline().decode('utf-8', errors='ignore').strip()
-                except Exception as e:
-                    logging.error(f"_send_echonet: readline error: {e}")
-                    return None
-
-                if line:
-                    logging.debug(f"_send_echonet: recv line={line[:80]}...")
-
-                # EVENT 29: PANAセッション切断通知
-                if line.startswith("EVENT 29"):
-                    logging.error("PANA session disconnected (EVENT 29), triggering reconnect")
-                    self._needs_reconnect = True
-                    return None
-
-                # EVENT 21: 送信結果 (EVENT 21 <IPv6> <SIDE> <RESULT>)
-                # RESULT: 00=成功, 01=失敗, 02=IP再送回数オーバー
-                if line.startswith("EVENT 21"):
-                    parts = line.split(" ")
-                    if len(parts) >= 4:
-                        result_code = parts[-1]
-                        if result_code != "00":
-                            if _retry_count < MAX_SEND_RETRIES:
-                                logging.warning(f"Send failed: EVENT 21 result={result_code}, retrying ({_retry_count + 1}/{MAX_SEND_RETRIES})...")
-                                time.sleep(1)
-                                return self._send_echonet(epc, _retry_count + 1)
-                            else:
-                                logging.warning(f"Send failed: EVENT 21 result={result_code}, retries exhausted, will reconnect")
-                                self._needs_reconnect = True
-                                return None
-
-                if line.startswith("ERXUDP"):
-                    # ERXUDP応答をパース
-                    # SA2=1の場合: ERXUDP SENDER DEST RPORT LPORT SENDERLLA RSSI SECURED SIDE DATALEN DATA
-                    # SA2=0の場合: ERXUDP SENDER DEST RPORT LPORT SENDERLLA SECURED SIDE DATALEN DATA
-                    parts = line.split(" ")
-                    logging.debug(f"ERXUDP parts({len(parts)}): {[p[:20] for p in parts]}")
-                    if len(parts) >= 11:
-                        # SA2=1: RSSIあり
-                        rssi_raw = int(parts[6], 16)
-                        self.last_rssi = rssi_raw - 107  # dBmに変換
-                        logging.debug(f"RSSI: raw=0x{parts[6]} ({rssi_raw}) -> {self.last_rssi} dBm")
-                        data = parts[10]
-                        dest = parts[2]
-                    elif len(parts) >= 10:
-                        # SA2=0: RSSIなし
-                        logging.debug(f"ERXUDP: SA2=0 mode (no RSSI), parts[6]={parts[6]}")
-                        data = parts[9]
-                        dest = parts[2]
-                    else:
-                        continue
-
-                    # ユニキャスト宛のレスポンスのみ処理（マルチキャストFF02:はスキップ）
-                    if dest.startswith("FF02:"):
-                        continue
-                    # ECHONET Liteヘッダチェック（1081で始まらないデータはスキップ）
-                    if not data.startswith("1081"):
-                        logging.debug(f"ERXUDP ignored: not ECHONET Lite (data={data[:20]}...)")
-                        continue
-                    # ECHONET Liteレスポンスをパース
-                    result = self._parse_echonet_response(data, epc)
-                    if result is not None:
-                        self.consecutive_timeouts = 0  # 成功したらリセット
-                        if _retry_count > 0:
-                            logging.info(f"Send succeeded on retry {_retry_count}")
-                        return result
-                    else:
-                        logging.debug(f"ERXUDP ignored: EPC mismatch (expected={epc}, data={data[:40]}...)")
-            else:
-                time.sleep(0.1)
+        # 応答待ち（直近の応答時間に合わせたタイムアウト。失敗した要求を早めに切り上げる）
+        sent_at = time.monotonic()
+        timeout = self._response_timeout()
+        deadline = sent_at + timeout
+        while True:
+            try:
+                line = self._readline_with_deadline(deadline)
+            except serial.SerialException as e:
+                logging.error(f"_send_echonet: serial read error: {e}")
+                self._needs_reconnect = True
+                return None
+            except Exception as e:
+                logging.error(f"_send_echonet: readline error: {e}")
+                return None
+            if line is None:
+                break
+
+            # 受信行はバイト列のまま判定し、ECHONET Liteデータ部のみデコードする
+            if debug and line:
+                logging.debug(f"_send_echonet: recv line={line[:80].decode('ascii', errors='replace')}...")
+
+            m = self._RESPONSE_LINE_RE.match(line)
+            if m is None:
+                continue
+            kind = m.lastgroup
+
+            # EVENT 29: PANAセッション切断通知
+            if kind == "ev29":
+                logging.error("PANA session disconnected (EVENT 29), triggering reconnect")
+                self._needs_reconnect = True
+                return None
 
-        logging.warning(f"_send_echonet: timeout for EPC={epc}")
+            # EVENT 21: 送信結果 (EVENT 21 <IPv6> <SIDE> <RESULT>)
+            # RESULT: 00=成功, 01=失敗, 02=IP再送回数オーバー
+            elif kind == "ev21":
+                parts = line.split(b" ")
+                if len(parts) >= 4:
+                    result_code = parts[-1].decode('ascii', errors='replace')
+                    if result_code != "00":
+                        if _retry_count < MAX_SEND_RETRIES:
+                            logging.warning(f"Send failed: EVENT 21 result={result_code}, retrying ({_retry_count + 1}/{MAX_SEND_RETRIES})...")
+                            time.sleep(1)
+                            return self._send_echonet_multi(epcs, _retry_count + 1)
+                        else:
+                            logging.warning(f"Send failed: EVENT 21 result={result_code}, retries exhausted, will reconnect")
+                            self._needs_reconnect = True
+                            return None
+
+            elif kind == "erxudp":
+                # ERXUDP応答をパース
+                # SA2=1の場合: ERXUDP SENDER DEST RPORT LPORT SENDERLLA RSSI SECURED SIDE DATALEN DATA
+                # SA2=0の場合: ERXUDP SENDER DEST RPORT LPORT SENDERLLA SECURED SIDE DATALEN DATA
+                parts = line.split(b" ")
+                if debug:
+                    logging.debug(f"ERXUDP parts({len(parts)}): {[p[:20] for p in parts]}")
+                if len(parts) >= 11:
+                    # SA2=1: RSSIあり
+                    rssi_raw = int(parts[6], 16)
+                    self.last_rssi = rssi_raw - 107  # dBmに変換
+                    if debug:
+                        logging.debug(f"RSSI: raw=0x{parts[6].decode('ascii')} ({rssi_raw}) -> {self.last_rssi} dBm")
+                    data = parts[10]
+                    dest = parts[2]
+                elif len(parts) >= 10:
+                    # SA2=0: RSSIなし
+                    if debug:
+                        logging.debug(f"ERXUDP: SA2=0 mode (no RSSI), parts[6]={parts[6].decode('ascii', errors='replace')}")
+                    data = parts[9]
+                    dest = parts[2]
+                else:
+                    continue
+
+                # ユニキャスト宛のレスポンスのみ処理（マルチキャストFF02:はスキップ）
+                if dest.startswith(b"FF02:"):
+                    continue
+                # ECHONET Liteヘッダチェック（1081で始まらないデータはスキップ）
+                if not data.startswith(b"1081"):
+                    logging.debug(f"ERXUDP ignored: not ECHONET Lite (data={data[:20]})")
+                    continue
+                # 以前の要求への遅延応答はTIDが一致しないので読み捨てる
+                if data[4:8].upper() != tid_hex:
+                    logging.debug(f"ERXUDP ignored: TID mismatch (expected={tid_hex.decode()}, data={data[:40]})")
+                    continue
+                # ECHONET Liteレスポンスをパース（要求した全EPCを含む応答のみ採用）
+                data = data.decode('ascii')
+                result = self._parse_echonet_response(data, epcs)
+                if result is not None and all(e in result for e in epcs):
+                    self.consecutive_timeouts = 0  # 成功したらリセット
+                    self._record_rtt(time.monotonic() - sent_at)
+                    if _retry_count > 0:
+                        logging.info(f"Send succeeded on retry {_retry_count}")
+                    return result
+                else:
+                    logging.debug(f"ERXUDP ignored: EPC mismatch (expected={epc}, data={data[:40]}...)")
+
+        logging.warning(f"_send_echonet: timeout for EPC={epc} ({timeout:.1f}s)")
         self.consecutive_timeouts += 1
+        # 応答が遅くなっただけの可能性もあるので、次の要求は上限値で待つ
+        self._rtt_ewma = None
         logging.info(f"Consecutive timeouts: {self.consecutive_timeouts}/{self.max_timeouts_before_reconnect}")
 
         # 連続タイムアウトが閾値に達したら即座に再接続してリトライ
@@ -503,53 +721,71 @@ class WiSUNClient:
                 # リトライ前にバッファを再度クリア（遅延到着データ対策）
                 if self.ser:
                     time.sleep(0.5)
-                    while self.ser.in_waiting > 0:
-                        discarded = self.ser.read(self.ser.in_waiting)
-                        logging.debug(f"Discarded {len(discarded)} bytes before retry")
+                    discarded = self._discard_input()
+                    logging.debug(f"Discarded {len(discarded)} bytes before retry")
                 # 再接続成功したら即座にリトライ
                 logging.info("Retrying after reconnect...")
-                return self._send_echonet(epc)
+                return self._send_echonet_multi(epcs)
             else:
                 logging.error("Immediate reconnect failed")
                 self.consecutive_timeouts = 0
 
         return None
 
-    def _parse_echonet_response(self, data: str, expected_epc: str) -> Optional[str]:
-        """ECHONET Liteレスポンスをパースしてプロパティ値を取得"""
-        try:
-            # 最低限の長さチェック
-            if len(data) < 24:
-                return None
-
-            # ヘッダチェック (1081)
-            if data[0:4] != "1081":
-                return None
+    def _parse_echonet_response(self, data: str,
+                                epcs: Optional[list[str]] = None) -> Optional[dict[str, bytes]]:
+        """
+        ECHONET Liteレスポンスをパースしてプロパティ値を取得
 
-            # ESVチェック（72=Get_Res, 71=Set_Res）
-            esv = data[20:22]
-            if esv not in ["72", "71", "52"]:
-                return None
+        Args:
+            data: ECHONET Liteフレームの16進文字列
+            epcs: 取り出すEPCのリスト（Noneなら全プロパティ）
 
-            # OPC（プロパティ数）
-            opc = int(data[22:24], 16)
+        Returns:
+            {EPC（16進大文字）: EDTのバイト列}。ECHONET Liteの応答でなければNone
+        """
+        # 16進文字列は一度だけバイト列に変換し、以降はインデックスで読む
+        try:
+            raw = bytes.fromhex(data)
+        except ValueError as e:
+            logging.warning(f"Parse error: {e}")
+            return None
+        size = len(raw)
 
-            # プロパティをパース
-            pos = 24
-            for _ in range(opc):
-                epc = data[pos:pos+2]
-                pdc = int(data[pos+2:pos+4], 16)
-                edt = data[pos+4:pos+4+pdc*2]
+        # 最低限の長さチェック（EHD〜OPCの12バイト）
+        if size < 12:
+            return None
 
-                if epc.upper() == expected_epc.upper():
-                    return edt
+        # ヘッダチェック (1081)
+        if raw[0] != 0x10 or raw[1] != 0x81:
+            return None
 
-                pos += 4 + pdc * 2
+        # ESVチェック（72=Get_Res, 71=Set_Res, 52=Get_SNA）
+        esv = raw[10]
+        if esv not in (0x72, 0x71, 0x52):
+            return None
 
-        except Exception as e:
-            logging.warning(f"Parse error: {e}")
+        # OPC（プロパティ数）
+        opc = raw[11]
 
-        return None
+        # プロパティを1回の走査でパース（要求外のEPCはEDTを切り出さずに読み飛ばす）
+        keys = self._EPC_KEYS
+        props = {}
+        pos = 12
+        for _ in range(opc):
+            if pos + 2 > size:
+                logging.warning(f"Parse error: truncated property header at byte {pos}")
+                return None
+            key = keys[raw[pos]]
+            pdc = raw[pos + 1]
+            end = pos + 2 + pdc
+            if end > size:
+                logging.warning(f"Parse error: EDT of EPC={key} truncated ({size - pos - 2}/{pdc} bytes)")
+                return None
+            if epcs is None or key in epcs:
+                props[key] = raw[pos + 2:end]
+            pos = end
+        return props
 
     def get_instant_power(self) -> Optional[int]:
         """
@@ -560,13 +796,42 @@ class WiSUNClient:
         """
         logging.debug("get_instant_power: sending request...")
         edt = self._send_echonet(self.EPC_INSTANT_POWER)
-        logging.debug(f"get_instant_power: edt={edt}")
-        if edt and len(edt) == 8:
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"get_instant_power: edt={edt.hex() if edt else None}")
+        if edt and len(edt) == 4:
             # 符号付き32ビット整数
-            value = int(edt, 16)
-            if value >= 0x80000000:
-                value -= 0x100000000
-            return value
+            return int.from_bytes(edt, "big", signed=True)
+        return None
+
+    def _decode_energy_unit(self, edt: Optional[bytes]) -> Optional[float]:
+        """積算電力量単位（E1）のEDTをkWhに変換"""
+        if edt and len(edt) == 1:
+            return self._UNIT_MAP.get(edt[0], 0.1)  # デフォルト0.1kWh
+        return None
+
+    def _decode_cumulative_energy(self, edt: Optional[bytes], unit: float) -> Optional[float]:
+        """積算電力量（E0/E3）のEDTをkWhに変換"""
+        if edt and len(edt) == 4:
+            # 符号なし32ビット整数
+            value = int.from_bytes(edt, "big")
+            if value == 0xFFFFFFFE:  # オーバーフロー
+                return None
+            return value * unit
+        return None
+
+    def _decode_fixed_cumulative_energy(self, edt: Optional[bytes], unit: float) -> Optional[dict]:
+        """定時積算電力量（EA）のEDTを計測日時と積算値に変換"""
+        if edt and len(edt) == 11:
+            # 年(2バイト) + 月(1) + 日(1) + 時(1) + 分(1) + 秒(1) + 積算電力量(4バイト)
+            year, month, day, hour, minute, second, energy_raw = struct.unpack(">HBBBBBI", edt)
+
+            if energy_raw == 0xFFFFFFFE:  # オーバーフロー
+                return None
+
+            return {
+                "timestamp": f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}",
+                "energy": energy_raw * unit
+            }
         return None
 
     def _get_energy_unit(self) -> Optional[float]:
@@ -579,25 +844,11 @@ class WiSUNClient:
         if self.energy_unit is not None:
             return self.energy_unit
 
-        edt = self._send_echonet(self.EPC_CUMULATIVE_ENERGY_UNIT)
-        if edt and len(edt) == 2:
-            code = int(edt, 16)
-            # 0x00=1kWh, 0x01=0.1kWh, 0x02=0.01kWh, 0x03=0.001kWh
-            # 0x04=0.0001kWh, 0x0A=10kWh, 0x0B=100kWh, 0x0C=1000kWh, 0x0D=10000kWh
-            unit_map = {
-                0x00: 1.0,
-                0x01: 0.1,
-                0x02: 0.01,
-                0x03: 0.001,
-                0x04: 0.0001,
-                0x0A: 10.0,
-                0x0B: 100.0,
-                0x0C: 1000.0,
-                0x0D: 10000.0,
-            }
-            self.energy_unit = unit_map.get(code, 0.1)  # デフォルト0.1kWh
-            return self.energy_unit
-        return None
+        unit = self._decode_energy_unit(self._send_echonet(self.EPC_CUMULATIVE_ENERGY_UNIT))
+        if unit is not None:
+            self.energy_unit = unit
+            self._save_cache()
+        return unit
 
     def get_cumulative_energy(self) -> Optional[float]:
         """
@@ -611,13 +862,7 @@ class WiSUNClient:
             unit = 0.1  # デフォルト
 
         edt = self._send_echonet(self.EPC_CUMULATIVE_ENERGY)
-        if edt and len(edt) == 8:
-            # 符号なし32ビット整数
-            value = int(edt, 16)
-            if value == 0xFFFFFFFE:  # オーバーフロー
-                return None
-            return value * unit
-        return None
+        return self._decode_cumulative_energy(edt, unit)
 
     def get_cumulative_energy_reverse(self) -> Optional[float]:
         """
@@ -631,13 +876,7 @@ class WiSUNClient:
             unit = 0.1  # デフォルト
 
         edt = self._send_echonet(self.EPC_CUMULATIVE_ENERGY_REV)
-        if edt and len(edt) == 8:
-            # 符号なし32ビット整数
-            value = int(edt, 16)
-            if value == 0xFFFFFFFE:  # オーバーフロー
-                return None
-            return value * unit
-        return None
+        return self._decode_cumulative_energy(edt, unit)
 
     def get_fixed_cumulative_energy(self) -> Optional[dict]:
         """
@@ -656,24 +895,7 @@ class WiSUNClient:
             unit = 0.1  # デフォルト
 
         edt = self._send_echonet(self.EPC_CUMULATIVE_ENERGY_FIXED)
-        if edt and len(edt) == 22:  # 11バイト
-            # 年(2バイト) + 月(1) + 日(1) + 時(1) + 分(1) + 秒(1) + 積算電力量(4バイト)
-            year = int(edt[0:4], 16)
-            month = int(edt[4:6], 16)
-            day = int(edt[6:8], 16)
-            hour = int(edt[8:10], 16)
-            minute = int(edt[10:12], 16)
-            second = int(edt[12:14], 16)
-            energy_raw = int(edt[14:22], 16)
-
-            if energy_raw == 0xFFFFFFFE:  # オーバーフロー
-                return None
-
-            return {
-                "timestamp": f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}",
-                "energy": energy_raw * unit
-            }
-        return None
+        return self._decode_fixed_cumulative_energy(edt, unit)
 
     def get_power_data(self) -> dict:
         """
@@ -684,6 +906,10 @@ class WiSUNClient:
         """
         data = {"instant_power": None}
 
+        # USBアダプタの抜去を検知（タイムアウトを待たずに再接続待ちへ）
+        if not self._check_port():
+            return data
+
         # バックオフ中はスキップ
         if self._reconnect_backoff > 0:
             self._reconnect_backoff -= 1
@@ -700,11 +926,19 @@ class WiSUNClient:
                 self.consecutive_timeouts = 0
                 self._needs_reconnect = False
                 self._reconnect_backoff = 0
+                self._reconnect_attempt = 0
             else:
-                logging.error("Reconnection failed, backing off before retry")
                 self.consecutive_timeouts = 0
                 self._needs_reconnect = True  # 次回も再接続を試みる
-                self._reconnect_backoff = 12  # 12ポーリング分待機（5秒x12=60秒）
+                # 指数バックオフ（1, 2, 4, ... 最大60ポーリング）+ ジッター
+                self._reconnect_backoff = min(2 ** self._reconnect_attempt, 60) + random.randint(0, 2)
+                self._reconnect_attempt += 1
+                logging.error(f"Reconnection failed, backing off {self._reconnect_backoff} polls before retry")
+                # メーター無応答かアダプタのハングかをSKVERで切り分け
+                if not self._adapter_alive():
+                    logging.error("Wi-SUN adapter not responding to SKVER, reopening serial port")
+                    self.close()
+                    self.open()
                 return data
 
         # 瞬時電力
@@ -714,6 +948,34 @@ class WiSUNClient:
 
         return data
 
+    def _check_port(self) -> bool:
+        """
+        シリアルデバイスの存在を確認（ウォッチドッグ）
+
+        抜去されていればポートを閉じて再接続待ちにし、
+        再び現れたらポートを開き直す。Windows（COMポート）では常にTrue
+
+        Returns:
+            デバイスが使える状態ならTrue
+        """
+        if os.name != "posix":
+            return True
+
+        if not os.path.exists(self.port):
+            if not self._port_lost:
+                logging.error(f"Serial device {self.port} disappeared, waiting for it to come back")
+                self._port_lost = True
+                self.close()
+            self._needs_reconnect = True
+            return False
+
+        if self._port_lost:
+            logging.info(f"Serial device {self.port} is back, reopening")
+            if not self.open():
+                return False
+            self._port_lost = False
+        return True
+
     def get_energy_data(self) -> dict:
         """
         積算電力量データを取得
@@ -736,23 +998,38 @@ class WiSUNClient:
             "energy_unit": None
         }
 
+        # 全プロパティを1電文でGet（単位が未取得ならE1も含める）
+        epcs = [
+            self.EPC_CUMULATIVE_ENERGY,
+            self.EPC_CUMULATIVE_ENERGY_REV,
+            self.EPC_CUMULATIVE_ENERGY_FIXED,
+        ]
+        if self.energy_unit is None:
+            epcs.insert(0, self.EPC_CUMULATIVE_ENERGY_UNIT)
+
+        props = self._send_echonet_multi(epcs)
+        if not props:
+            return data
+
+        # 単位
+        if self.energy_unit is None:
+            self.energy_unit = self._decode_energy_unit(props.get(self.EPC_CUMULATIVE_ENERGY_UNIT))
+            if self.energy_unit is not None:
+                self._save_cache()
+        unit = self.energy_unit if self.energy_unit is not None else 0.1  # デフォルト
+        data["energy_unit"] = self.energy_unit
+
         # 積算電力量（正方向）
-        energy = self.get_cumulative_energy()
-        if energy is not None:
-            data["cumulative_energy"] = energy
+        data["cumulative_energy"] = self._decode_cumulative_energy(
+            props.get(self.EPC_CUMULATIVE_ENERGY), unit)
 
         # 積算電力量（逆方向）
-        energy_rev = self.get_cumulative_energy_reverse()
-        if energy_rev is not None:
-            data["cumulative_energy_reverse"] = energy_rev
+        data["cumulative_energy_reverse"] = self._decode_cumulative_energy(
+            props.get(self.EPC_CUMULATIVE_ENERGY_REV), unit)
 
         # 定時積算電力量
-        fixed = self.get_fixed_cumulative_energy()
-        if fixed is not None:
-            data["fixed_energy"] = fixed
-
-        # 単位
-        data["energy_unit"] = self.energy_unit
+        data["fixed_energy"] = self._decode_fixed_cumulative_energy(
+            props.get(self.EPC_CUMULATIVE_ENERGY_FIXED), unit)
 
         return data
 